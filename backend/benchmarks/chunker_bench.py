@@ -0,0 +1,290 @@
+"""
+Compare the token-budget chunker against the old fixed-window chunker
+over a corpus of saved transcripts.
+
+Save transcripts first (needs network):
+    python -m benchmarks.chunker_bench --save <url-or-id> ... --corpus transcripts/
+
+or generate a seeded synthetic corpus with caption-like timing (~160 words
+per minute, a snippet every few seconds; half of the videos unpunctuated
+like auto-generated captions):
+    python -m benchmarks.chunker_bench --synthesize 20 --corpus transcripts/
+
+Then run the comparison:
+    python -m benchmarks.chunker_bench --corpus transcripts/
+    python -m benchmarks.chunker_bench --corpus transcripts/ --embed   # real embeddings
+
+Retrieval quality is measured by self-retrieval: sampled transcript
+sentences are used as queries, and a hit means one of the top-k chunks
+covers the moment the sentence was spoken. Without --embed, chunks are
+ranked by TF-IDF cosine so the benchmark runs offline.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+from collections import Counter
+from pathlib import Path
+from types import SimpleNamespace
+
+from pipeline.chunking import chunk_by_timestamp, chunk_by_tokens, estimate_tokens, iter_sentences
+
+# text-embedding-3-small, USD per 1M input tokens
+EMBEDDING_COST_PER_MILLION = 0.02
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def load_corpus(corpus_dir: Path) -> list[tuple[str, SimpleNamespace]]:
+    transcripts = []
+    for path in sorted(corpus_dir.glob("*.json")):
+        data = json.loads(path.read_text())
+        snippets = [SimpleNamespace(**snippet) for snippet in data["snippets"]]
+        if snippets:
+            transcripts.append((path.stem, SimpleNamespace(snippets=snippets)))
+    return transcripts
+
+
+def save_transcripts(videos: list[str], corpus_dir: Path) -> None:
+    from pipeline.rag import extract_video_id, fetch_transcript
+
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    for video in videos:
+        transcript, title = fetch_transcript(video)
+        video_id = extract_video_id(video)
+        data = {
+            "video_id": video_id,
+            "title": title,
+            "snippets": [
+                {"text": s.text, "start": s.start, "duration": s.duration}
+                for s in transcript.snippets
+            ]
+        }
+        (corpus_dir / f"{video_id}.json").write_text(json.dumps(data))
+        print(f"Saved {len(data['snippets'])} snippets for {video_id}")
+
+
+# Most frequent English words, so function words dominate as in speech
+_FUNCTION_WORDS = (
+    "the of and to a in is you that it he was for on are as with his they i at be this have "
+    "from or one had by but not what all were we when your can said there use an each which "
+    "she do how their if will up other about out many then them these so some her would make "
+    "like him into time has look two more go see no way could people my than first been who "
+    "its now find long down day did get come made may part"
+).split()
+_SYLLABLES = [c + v for c in "bcdfghklmnprstvw" for v in ("a", "e", "i", "o", "u", "ai", "ou")]
+
+
+def _pseudo_word(rng: random.Random) -> str:
+    return "".join(rng.choice(_SYLLABLES) for _ in range(rng.choice((1, 2, 2, 2, 3, 3, 4))))
+
+
+def synthesize_transcript(rng: random.Random, minutes: float, punctuated: bool) -> list[dict]:
+    """
+    Caption-shaped snippets for a talk that moves through topics every
+    1-2 minutes, each with its own content words, so self-retrieval has
+    something to find.
+    """
+    general = [_pseudo_word(rng) for _ in range(1500)]
+    snippets = []
+    words: list[str] = []
+    now = 0.0
+    snippet_start = 0.0
+    snippet_words = rng.randint(6, 11)
+
+    while now < minutes * 60:
+        topic = [_pseudo_word(rng) for _ in range(40)]
+        topic_end = now + rng.uniform(60, 120)
+        while now < topic_end:
+            sentence = []
+            for _ in range(rng.randint(6, 22)):
+                roll = rng.random()
+                if roll < 0.5:
+                    sentence.append(rng.choice(_FUNCTION_WORDS))
+                elif roll < 0.75:
+                    sentence.append(rng.choice(topic))
+                else:
+                    sentence.append(general[min(int(rng.paretovariate(1.2)) - 1, len(general) - 1)])
+            if punctuated:
+                sentence[0] = sentence[0].capitalize()
+                sentence[-1] += rng.choice(".....?!")
+
+            for word in sentence:
+                if not words:
+                    snippet_start = now
+                words.append(word)
+                # ~160 words per minute with some jitter
+                now += rng.uniform(0.25, 0.5)
+                if len(words) >= snippet_words:
+                    snippets.append({"text": " ".join(words), "start": round(snippet_start, 2),
+                                     "duration": round(now - snippet_start, 2)})
+                    words = []
+                    snippet_words = rng.randint(6, 11)
+
+    if words:
+        snippets.append({"text": " ".join(words), "start": round(snippet_start, 2),
+                         "duration": round(now - snippet_start, 2)})
+    return snippets
+
+
+def synthesize_corpus(count: int, corpus_dir: Path, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        video_id = f"synthetic{i:02d}"
+        data = {
+            "video_id": video_id,
+            "title": f"Synthetic talk {i}",
+            "snippets": synthesize_transcript(rng, minutes=rng.uniform(5, 25), punctuated=i % 2 == 0)
+        }
+        (corpus_dir / f"{video_id}.json").write_text(json.dumps(data))
+    print(f"Synthesized {count} transcripts in {corpus_dir}")
+
+
+def timestamp_chunks(transcript) -> list[dict]:
+    """
+    The old chunker doesn't record end times; a chunk ends where the next
+    one starts (or at the end of the transcript).
+    """
+    chunks = chunk_by_timestamp(transcript, seconds_per_chunk=30)
+    last = transcript.snippets[-1]
+    transcript_end = last.start + getattr(last, "duration", 0.0)
+
+    for chunk, following in zip(chunks, chunks[1:] + [None]):
+        chunk["end"] = following["start"] if following else transcript_end
+        chunk["tokens"] = estimate_tokens(chunk["text"])
+    return chunks
+
+
+def probe_sentences(transcript, every: int = 10) -> list[dict]:
+    sentences = [s for s in iter_sentences(transcript, max_tokens=60) if s["tokens"] >= 5]
+    return sentences[::every]
+
+
+def _vector(text: str, idf: dict[str, float]) -> dict[str, float]:
+    counts = Counter(_WORD.findall(text.lower()))
+    return {word: count * idf.get(word, 0.0) for word, count in counts.items()}
+
+
+def _cosine(a: dict[str, float], b: dict[str, float]) -> float:
+    dot = sum(weight * b.get(word, 0.0) for word, weight in a.items())
+    norm = math.sqrt(sum(w * w for w in a.values())) * math.sqrt(sum(w * w for w in b.values()))
+    return dot / norm if norm else 0.0
+
+
+def lexical_rankings(chunks: list[dict], queries: list[str]) -> list[list[int]]:
+    document_freq = Counter()
+    for chunk in chunks:
+        document_freq.update(set(_WORD.findall(chunk["text"].lower())))
+    idf = {word: math.log(len(chunks) / df) + 1.0 for word, df in document_freq.items()}
+
+    chunk_vectors = [_vector(chunk["text"], idf) for chunk in chunks]
+    rankings = []
+    for query in queries:
+        query_vector = _vector(query, idf)
+        scores = [_cosine(query_vector, vector) for vector in chunk_vectors]
+        rankings.append(sorted(range(len(chunks)), key=lambda i: -scores[i]))
+    return rankings
+
+
+async def embedding_rankings(chunks: list[dict], queries: list[str]) -> list[list[int]]:
+    from pipeline.rag import embed_chunks, embed_query
+
+    chunks = await embed_chunks([{"text": chunk["text"]} for chunk in chunks])
+    rankings = []
+    for query in queries:
+        query_embedding = await embed_query(query)
+        # OpenAI embeddings are unit length, so the dot product is the cosine
+        scores = [sum(a * b for a, b in zip(query_embedding, c["embedding"])) for c in chunks]
+        rankings.append(sorted(range(len(chunks)), key=lambda i: -scores[i]))
+    return rankings
+
+
+async def evaluate(name: str, chunker, corpus, embed: bool, top_k: int) -> dict:
+    chunk_count = 0
+    chunk_tokens = []
+    hits = 0
+    probes_total = 0
+
+    for _, transcript in corpus:
+        chunks = chunker(transcript)
+        chunk_count += len(chunks)
+        chunk_tokens.extend(chunk["tokens"] for chunk in chunks)
+
+        probes = probe_sentences(transcript)
+        queries = [probe["text"] for probe in probes]
+        if embed:
+            rankings = await embedding_rankings(chunks, queries)
+        else:
+            rankings = lexical_rankings(chunks, queries)
+
+        for probe, ranking in zip(probes, rankings):
+            probes_total += 1
+            if any(chunks[i]["start"] <= probe["start"] < chunks[i]["end"] for i in ranking[:top_k]):
+                hits += 1
+
+    total_tokens = sum(chunk_tokens)
+    mean_tokens = total_tokens / len(chunk_tokens) if chunk_tokens else 0.0
+    return {
+        "chunker": name,
+        "chunks": chunk_count,
+        "embedding_tokens": total_tokens,
+        "embedding_cost_usd": total_tokens * EMBEDDING_COST_PER_MILLION / 1_000_000,
+        "mean_chunk_tokens": mean_tokens,
+        "max_chunk_tokens": max(chunk_tokens, default=0),
+        "top_k": top_k,
+        "prompt_context_tokens": mean_tokens * top_k,
+        "recall@top_k": hits / probes_total if probes_total else 0.0,
+    }
+
+
+def print_table(results: list[dict]) -> None:
+    columns = list(results[0])
+    widths = [max(len(column), 14) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in results:
+        cells = []
+        for column, width in zip(columns, widths):
+            value = row[column]
+            if isinstance(value, float):
+                value = f"{value:.6f}" if column == "embedding_cost_usd" else f"{value:.2f}"
+            cells.append(str(value).ljust(width))
+        print("  ".join(cells))
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, required=True, help="directory of saved transcript JSON files")
+    parser.add_argument("--save", nargs="+", metavar="VIDEO", help="fetch and save these videos into the corpus first")
+    parser.add_argument("--synthesize", type=int, metavar="N", help="write N synthetic transcripts into the corpus first")
+    parser.add_argument("--embed", action="store_true", help="rank with OpenAI embeddings instead of TF-IDF")
+    parser.add_argument("--max-tokens", type=int, default=150)
+    parser.add_argument("--overlap-tokens", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=2, help="chunks retrieved per question for the token chunker")
+    parser.add_argument("--baseline-top-k", type=int, default=3, help="chunks retrieved per question before")
+    args = parser.parse_args()
+
+    if args.save:
+        save_transcripts(args.save, args.corpus)
+    if args.synthesize:
+        synthesize_corpus(args.synthesize, args.corpus)
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        parser.error(f"no transcripts found in {args.corpus}")
+    print(f"Corpus: {len(corpus)} transcripts\n")
+
+    def token_chunks(transcript):
+        return chunk_by_tokens(transcript, args.max_tokens, args.overlap_tokens)
+
+    results = [
+        await evaluate("timestamp-30s", timestamp_chunks, corpus, args.embed, args.baseline_top_k),
+        await evaluate(f"tokens-{args.max_tokens}", token_chunks, corpus, args.embed, args.top_k),
+    ]
+    print_table(results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,186 @@
+"""
+Exercise LLM hedging against a local OpenAI-compatible stand-in.
+
+Starts a small streaming /v1/chat/completions server on localhost whose
+behaviour is chosen by the requested model name, then drives
+hedged_stream() through a real AsyncOpenAI client:
+
+    ttft=<seconds>   delay before the first token
+    fail             answer with HTTP 500 instead of streaming
+
+Scenarios: primary wins, hedge wins after the deadline, primary errors,
+both attempts fail, the losing stream is closed, and the hedge-rate cap
+holds under concurrent requests. Exits non-zero if any scenario fails.
+
+    python -m benchmarks.hedging_bench
+"""
+import asyncio
+import json
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+
+import uvicorn
+from openai import AsyncOpenAI
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from pipeline.hedging import HedgeStats, HedgeTarget, hedged_stream
+
+DEADLINE = 0.2
+TOKENS = ["Hello", " from", " the", " stand-in."]
+
+# Per model name: streams started, finished, and closed early by the client
+server_stats: dict[str, Counter] = {}
+
+
+def parse_model(model: str) -> dict:
+    behaviour = {"ttft": 0.0, "fail": False}
+    for part in model.split(":"):
+        if part == "fail":
+            behaviour["fail"] = True
+        elif part.startswith("ttft="):
+            behaviour["ttft"] = float(part[len("ttft="):])
+    return behaviour
+
+
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body["model"]
+    behaviour = parse_model(model)
+    stats = server_stats.setdefault(model, Counter())
+    stats["started"] += 1
+
+    if behaviour["fail"]:
+        stats["failed"] += 1
+        return JSONResponse({"error": {"message": "injected failure", "type": "server_error"}}, status_code=500)
+
+    async def events():
+        finished = False
+        try:
+            await asyncio.sleep(behaviour["ttft"])
+            for token in TOKENS:
+                chunk = {
+                    "id": "chatcmpl-stand-in",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(0.01)
+            yield "data: [DONE]\n\n"
+            finished = True
+        finally:
+            stats["finished" if finished else "closed_early"] += 1
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def start_stand_in() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    app = Starlette(routes=[Route("/v1/chat/completions", chat_completions, methods=["POST"])])
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+
+    while not server.started:
+        time.sleep(0.01)
+    return port
+
+
+def targets(client, primary_model: str, hedge_model: str) -> tuple[HedgeTarget, HedgeTarget]:
+    return HedgeTarget("primary", client, primary_model), HedgeTarget("hedge", client, hedge_model)
+
+
+async def collect(client, primary_model: str, hedge_model: str, stats: HedgeStats) -> str:
+    primary, hedge = targets(client, primary_model, hedge_model)
+    return "".join([token async for token in hedged_stream([], primary, hedge, DEADLINE, stats)])
+
+
+async def run_scenarios(client) -> list[str]:
+    failures = []
+    expected = "".join(TOKENS)
+
+    def check(name: str, condition: bool, detail: str = "") -> None:
+        print(f"{'ok  ' if condition else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+        if not condition:
+            failures.append(name)
+
+    # Warm up the client's connection pool so setup cost isn't counted as TTFT
+    stream = await client.chat.completions.create(model="warmup", messages=[], stream=True)
+    async for _ in stream:
+        pass
+
+    # Primary answers before the deadline: no hedge is sent
+    stats = HedgeStats(max_rate=1.0, window=10)
+    text = await collect(client, "p1:ttft=0.02", "h1:ttft=0.02", stats)
+    check("primary wins", text == expected and stats.attempts["primary"]["won"] == 1 and stats.hedges_fired == 0)
+    check("no hedge request sent", "h1:ttft=0.02" not in server_stats)
+
+    # Primary is slow: the hedge fires at the deadline and wins
+    stats = HedgeStats(max_rate=1.0, window=10)
+    text = await collect(client, "p2:ttft=2.0", "h2:ttft=0.02", stats)
+    check("hedge wins after deadline", text == expected and stats.attempts["hedge"]["won"] == 1)
+    await asyncio.sleep(0.2)
+    check("slow primary stream closed", server_stats["p2:ttft=2.0"]["closed_early"] == 1,
+          str(dict(server_stats["p2:ttft=2.0"])))
+
+    # Both stream, primary's first token lands first: the hedge's stream is closed
+    stats = HedgeStats(max_rate=1.0, window=10)
+    text = await collect(client, "p3:ttft=0.25", "h3:ttft=0.4", stats)
+    check("late primary still wins", text == expected and stats.attempts["primary"]["won"] == 1)
+    await asyncio.sleep(0.3)
+    check("losing hedge stream closed", server_stats["h3:ttft=0.4"]["closed_early"] == 1,
+          str(dict(server_stats["h3:ttft=0.4"])))
+
+    # Primary errors before the deadline: hedge is sent straight away
+    stats = HedgeStats(max_rate=1.0, window=10)
+    started = time.monotonic()
+    text = await collect(client, "p4:fail", "h4:ttft=0.02", stats)
+    elapsed = time.monotonic() - started
+    check("hedge covers primary error", text == expected and stats.attempts["primary"]["error"] == 1
+          and elapsed < DEADLINE, f"{elapsed:.2f}s")
+
+    # Both attempts fail: the error reaches the caller
+    stats = HedgeStats(max_rate=1.0, window=10)
+    try:
+        await collect(client, "p5:fail", "h5:fail", stats)
+        check("both fail raises", False, "no exception")
+    except Exception as e:
+        check("both fail raises", stats.attempts["primary"]["error"] == 1 and stats.attempts["hedge"]["error"] == 1,
+              type(e).__name__)
+
+    # Rate cap: 20% of a 10-request window allows 2 hedges, even when all
+    # 5 slow requests hit the deadline at the same time
+    stats = HedgeStats(max_rate=0.2, window=10)
+    texts = await asyncio.gather(*(
+        collect(client, f"p6-{i}:ttft=0.5", f"h6-{i}:ttft=0.02", stats) for i in range(5)
+    ))
+    check("hedge cap holds under concurrency",
+          all(text == expected for text in texts) and stats.hedges_fired == 2 and stats.hedges_denied == 3,
+          f"fired {stats.hedges_fired}, denied {stats.hedges_denied}")
+
+    return failures
+
+
+def main() -> None:
+    port = start_stand_in()
+    # No SDK retries, so injected failures reach the hedging layer directly
+    client = AsyncOpenAI(base_url=f"http://127.0.0.1:{port}/v1", api_key="stand-in", max_retries=0)
+
+    failures = asyncio.run(run_scenarios(client))
+    if failures:
+        print(f"\n{len(failures)} scenario(s) failed")
+        sys.exit(1)
+    print("\nall scenarios passed")
+
+
+if __name__ == "__main__":
+    main()
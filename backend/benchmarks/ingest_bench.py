@@ -0,0 +1,355 @@
+"""
+Run the bulk ingest CLI against local stand-ins for OpenAI and Supabase.
+
+Starts a small server on localhost with a fake /v1/embeddings endpoint and
+just enough of PostgREST (/rest/v1/videos, /rest/v1/video_chunks) for
+ingest.py, writes a few synthetic saved transcripts, then runs
+`python ingest.py --transcripts ...` as a subprocess against them.
+
+Scenarios: a fresh run with paged inserts, resuming from the checkpoint,
+recovering from a write that died half way, skipping videos another user
+already ingested, a dry run, and the embedding request and token rate
+limits. Exits non-zero if any scenario fails.
+
+    python -m benchmarks.ingest_bench
+"""
+import base64
+import json
+import math
+import os
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from benchmarks.chunker_bench import synthesize_corpus
+from ingest import chunk_snippets, load_saved_transcript
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+USER_ID = "00000000-0000-0000-0000-000000000001"
+OTHER_USER_ID = "00000000-0000-0000-0000-000000000002"
+EMBEDDING_DIMENSIONS = 8
+MAX_TOKENS = 150
+OVERLAP_TOKENS = 20
+PAGE_SIZE = 5
+
+
+class StandIn:
+    """
+    In-memory tables plus a log of every request, shared with the server
+    thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tables: dict[str, list[dict]] = {"videos": [], "video_chunks": []}
+        # (monotonic time, input texts)
+        self.embedding_requests: list[tuple[float, list[str]]] = []
+        # Row counts of each insert into video_chunks
+        self.chunk_inserts: list[int] = []
+        self.writes = 0
+        # youtube id -> pages to accept before failing the next insert once
+        self.fail_after_pages: dict[str, int] = {}
+
+    def reset_logs(self) -> None:
+        with self.lock:
+            self.embedding_requests.clear()
+            self.chunk_inserts.clear()
+            self.writes = 0
+
+    def video(self, youtube_id: str, user_id: str = USER_ID) -> dict | None:
+        return next((v for v in self.tables["videos"]
+                     if v["youtube_id"] == youtube_id and v["user_id"] == user_id), None)
+
+    def chunks(self, video: dict) -> list[dict]:
+        return [c for c in self.tables["video_chunks"] if c["video_id"] == video["id"]]
+
+
+stand_in = StandIn()
+
+
+def _matches(row: dict, params) -> bool:
+    for column, condition in params.items():
+        if column in ("select", "limit", "order", "columns"):
+            continue
+        operator, _, expected = condition.partition(".")
+        # postgrest-py quotes values containing reserved characters (URLs)
+        expected = expected.strip('"')
+        value = row.get(column)
+        actual = str(value)
+        if isinstance(value, bool):
+            # Postgres reads true/True/TRUE alike
+            actual, expected = actual.lower(), expected.lower()
+        if operator == "eq" and actual != expected:
+            return False
+        if operator == "neq" and actual == expected:
+            return False
+    return True
+
+
+def _project(row: dict, select: str | None) -> dict:
+    if not select or select == "*":
+        return dict(row)
+    return {column.strip(): row.get(column.strip()) for column in select.split(",")}
+
+
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body["input"]
+    with stand_in.lock:
+        stand_in.embedding_requests.append((time.monotonic(), inputs))
+
+    data = []
+    for i, text in enumerate(inputs):
+        vector = [float(len(text) % (d + 2)) for d in range(EMBEDDING_DIMENSIONS)]
+        if body.get("encoding_format") == "base64":
+            embedding = base64.b64encode(struct.pack(f"{len(vector)}f", *vector)).decode()
+        else:
+            embedding = vector
+        data.append({"object": "embedding", "index": i, "embedding": embedding})
+
+    return JSONResponse({
+        "object": "list",
+        "data": data,
+        "model": body["model"],
+        "usage": {"prompt_tokens": 0, "total_tokens": 0}
+    })
+
+
+async def rest(request: Request):
+    table = request.path_params["table"]
+    params = request.query_params
+    body = await request.json() if request.method in ("POST", "PATCH") else None
+
+    with stand_in.lock:
+        rows = stand_in.tables[table]
+
+        if request.method == "GET":
+            found = [_project(row, params.get("select")) for row in rows if _matches(row, params)]
+            if "limit" in params:
+                found = found[:int(params["limit"])]
+            return JSONResponse(found)
+
+        stand_in.writes += 1
+
+        if request.method == "POST":
+            new_rows = body if isinstance(body, list) else [body]
+
+            if table == "video_chunks":
+                video = next(v for v in stand_in.tables["videos"] if v["id"] == new_rows[0]["video_id"])
+                pages_left = stand_in.fail_after_pages.get(video["youtube_id"])
+                if pages_left == 0:
+                    del stand_in.fail_after_pages[video["youtube_id"]]
+                    return JSONResponse({"code": "57014", "message": "injected failure",
+                                         "details": None, "hint": None}, status_code=500)
+                if pages_left is not None:
+                    stand_in.fail_after_pages[video["youtube_id"]] = pages_left - 1
+                stand_in.chunk_inserts.append(len(new_rows))
+
+            inserted = []
+            for row in new_rows:
+                row = {"id": str(uuid.uuid4()), **row}
+                if table == "videos":
+                    row.setdefault("chunks_ready", False)
+                rows.append(row)
+                inserted.append(row)
+            return JSONResponse(inserted, status_code=201)
+
+        if request.method == "PATCH":
+            updated = [row for row in rows if _matches(row, params)]
+            for row in updated:
+                row.update(body)
+            return JSONResponse(updated)
+
+        # DELETE
+        deleted = [row for row in rows if _matches(row, params)]
+        stand_in.tables[table] = [row for row in rows if not _matches(row, params)]
+        return JSONResponse(deleted)
+
+
+def start_stand_in() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    app = Starlette(routes=[
+        Route("/v1/embeddings", embeddings, methods=["POST"]),
+        Route("/rest/v1/{table}", rest, methods=["GET", "POST", "PATCH", "DELETE"]),
+    ])
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+
+    while not server.started:
+        time.sleep(0.01)
+    return port
+
+
+def _stand_in_key() -> str:
+    # create_client() only checks that the key looks like a JWT
+    def part(data: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+    return f"{part({'alg': 'HS256', 'typ': 'JWT'})}.{part({'role': 'service_role'})}.stand-in"
+
+
+def run_ingest(port: int, video_ids: list[str], *args: str) -> subprocess.CompletedProcess:
+    env = {
+        **os.environ,
+        "SUPABASE_URL": f"http://127.0.0.1:{port}",
+        "SUPABASE_SERVICE_ROLE_KEY": _stand_in_key(),
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{port}/v1",
+        "OPENAI_API_KEY": "stand-in",
+    }
+    return subprocess.run(
+        [sys.executable, "ingest.py", *args, *video_ids],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=300
+    )
+
+
+def within_rate(sent: list[tuple[float, float]], per_minute: float, slack: float = 0.5) -> tuple[bool, float]:
+    """
+    Check that no window of requests used more than a full bucket plus
+    what refilled during it. slack covers the gap between the limiter
+    granting a request and it arriving here (the first one opens the
+    connection). Returns (held, seconds from first to last).
+    """
+    rate = per_minute / 60
+    for i, (window_start, _) in enumerate(sent):
+        used = 0.0
+        for sent_at, amount in sent[i:]:
+            used += amount
+            if used > per_minute + rate * (sent_at - window_start + slack):
+                return False, sent[-1][0] - sent[0][0]
+    return True, sent[-1][0] - sent[0][0] if sent else 0.0
+
+
+def main() -> None:
+    port = start_stand_in()
+    failures = []
+
+    def check(name: str, condition: bool, detail: str = "") -> None:
+        print(f"{'ok  ' if condition else 'FAIL'} {name}{f' ({detail})' if detail else ''}")
+        if not condition:
+            failures.append(name)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        transcripts = tmp / "transcripts"
+        synthesize_corpus(3, transcripts, seed=1)
+        video_ids = sorted(path.stem for path in transcripts.glob("*.json"))
+
+        expected = {}
+        for video_id in video_ids:
+            snippets, _ = load_saved_transcript(transcripts, video_id)
+            expected[video_id] = chunk_snippets(snippets, MAX_TOKENS, OVERLAP_TOKENS)
+
+        def ingest(checkpoint: str, *args: str, user_id: str = USER_ID, videos: list[str] = video_ids):
+            stand_in.reset_logs()
+            result = run_ingest(
+                port, videos,
+                "--user-id", user_id,
+                "--transcripts", str(transcripts),
+                "--checkpoint", str(tmp / checkpoint),
+                "--page-size", str(PAGE_SIZE),
+                "--max-tokens", str(MAX_TOKENS),
+                "--overlap-tokens", str(OVERLAP_TOKENS),
+                *args
+            )
+            if result.returncode != 0:
+                print(result.stdout + result.stderr)
+            return result
+
+        def stored_correctly(video_id: str, user_id: str = USER_ID) -> bool:
+            video = stand_in.video(video_id, user_id)
+            if not video or not video["chunks_ready"]:
+                return False
+            stored = sorted((c["start_time"], c["end_time"], c["text"]) for c in stand_in.chunks(video))
+            wanted = sorted((c["start"], c["end"], c["text"]) for c in expected[video_id])
+            return stored == wanted
+
+        # One video dies half way through writing its chunks: the rest finish
+        stand_in.fail_after_pages[video_ids[0]] = 1
+        result = ingest("checkpoint.json")
+        partial = stand_in.video(video_ids[0])
+        check("failed write leaves video not ready",
+              partial is not None and not partial["chunks_ready"] and len(stand_in.chunks(partial)) == PAGE_SIZE,
+              f"{len(stand_in.chunks(partial)) if partial else 0} chunks left behind")
+        check("other videos stored", all(stored_correctly(video_id) for video_id in video_ids[1:]))
+        check("run reports the failure", "1 failed" in result.stdout)
+        check("inserts are paged", stand_in.chunk_inserts and max(stand_in.chunk_inserts) <= PAGE_SIZE,
+              f"{len(stand_in.chunk_inserts)} inserts, largest {max(stand_in.chunk_inserts, default=0)} rows")
+        done = set(json.loads((tmp / "checkpoint.json").read_text())["done"])
+        check("checkpoint has only finished videos", done == set(video_ids[1:]), str(sorted(done)))
+
+        # Restart with the same arguments: only the failed video is redone,
+        # and its leftover chunks are replaced rather than duplicated
+        result = ingest("checkpoint.json")
+        batches = math.ceil(len(expected[video_ids[0]]) / 256)
+        check("resume redoes only the unfinished video", "1 videos to ingest (2 already done)" in result.stdout
+              and len(stand_in.embedding_requests) == batches,
+              f"{len(stand_in.embedding_requests)} embedding requests")
+        check("leftover chunks replaced", stored_correctly(video_ids[0]))
+        pages = math.ceil(len(expected[video_ids[0]]) / PAGE_SIZE)
+        check("resumed video written in pages", len(stand_in.chunk_inserts) == pages,
+              f"{len(stand_in.chunk_inserts)} inserts for {len(expected[video_ids[0]])} chunks")
+
+        # Nothing left to do
+        ingest("checkpoint.json")
+        check("finished run is a no-op", not stand_in.embedding_requests and not stand_in.writes)
+
+        # Another user, fresh checkpoint: every video is already ingested
+        result = ingest("other_checkpoint.json", user_id=OTHER_USER_ID)
+        check("already ingested videos skipped", result.stdout.count("already ingested, skipping") == len(video_ids)
+              and not stand_in.embedding_requests and not stand_in.writes,
+              f"{len(stand_in.embedding_requests)} embedding requests, {stand_in.writes} writes")
+
+        # Dry run: embeds against the stand-in, writes nothing
+        result = ingest("dry_checkpoint.json", "--dry-run", user_id=OTHER_USER_ID)
+        check("dry run writes nothing", result.returncode == 0 and stand_in.embedding_requests
+              and not stand_in.writes and not (tmp / "dry_checkpoint.json").exists())
+
+        # Rate limits: the buckets start full (one minute's worth), so ask
+        # for ~10% more than that and the excess has to wait
+        video_id = video_ids[1]
+        chunks = expected[video_id]
+        tokens_by_text = {chunk["text"]: chunk["tokens"] for chunk in chunks}
+
+        tokens = sum(chunk["tokens"] for chunk in chunks)
+        tpm = tokens / 1.1
+        ingest("tpm_checkpoint.json", "--dry-run", "--embed-batch", "8", "--embed-tpm", str(tpm), videos=[video_id])
+        sent = [(t, sum(tokens_by_text[text] for text in texts)) for t, texts in stand_in.embedding_requests]
+        held, spread = within_rate(sent, tpm)
+        check("token rate limit holds", held and spread <= 60 * (tokens - tpm) / tpm + 1.0,
+              f"{tokens} tokens at {tpm:.0f}/min over {spread:.1f}s")
+
+        requests = math.ceil(len(chunks) / 2)
+        rpm = requests / 1.1
+        ingest("rpm_checkpoint.json", "--dry-run", "--embed-batch", "2", "--embed-rpm", str(rpm), videos=[video_id])
+        sent = [(t, 1) for t, _ in stand_in.embedding_requests]
+        held, spread = within_rate(sent, rpm)
+        check("request rate limit holds", held and len(sent) == requests and spread <= 60 * (requests - rpm) / rpm + 1.0,
+              f"{len(sent)} requests at {rpm:.1f}/min over {spread:.1f}s")
+
+    if failures:
+        print(f"\n{len(failures)} scenario(s) failed")
+        sys.exit(1)
+    print("\nall scenarios passed")
+
+
+if __name__ == "__main__":
+    main()
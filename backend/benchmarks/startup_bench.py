@@ -0,0 +1,233 @@
+"""
+Cold start benchmark for the backend.
+
+1. Import profile: runs `python -X importtime -c "import server"` in a fresh
+   interpreter and reports total import time and the slowest modules.
+2. Time to first accepted websocket: starts uvicorn with CLIENT_WARMUP=off
+   and measures how long until a handshake on /ws/audio is answered at all
+   (rejected, no clients touched) and until the first authenticated one is
+   accepted, which pays for building the lazy Supabase client. Without
+   --token, auth is answered by a local Supabase stand-in; with --token
+   and --conversation-id the real project from .env is used.
+
+Exits non-zero if a heavy client library is imported at import time, or
+if either measurement goes over its budget, so it can guard against
+cold start regressions in CI.
+
+    python -m benchmarks.startup_bench
+    python -m benchmarks.startup_bench --max-import-ms 800 --max-ready-ms 3000
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Must only be imported on first use (see clients.py)
+LAZY_MODULES = ["supabase", "openai", "pytube", "youtube_transcript_api", "websockets", "httpx", "uvicorn"]
+
+STAND_IN_USER_ID = "00000000-0000-0000-0000-000000000001"
+STAND_IN_CONVERSATION_ID = "00000000-0000-0000-0000-000000000002"
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(\s*)(\S+)")
+
+
+def import_profile() -> list[tuple[str, int, int]]:
+    """
+    Returns (module, self_us, cumulative_us) for every module imported
+    by `import server`.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    )
+    if result.returncode != 0:
+        sys.exit(f"import server failed:\n{result.stderr[-2000:]}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, _, module = match.groups()
+            modules.append((module, int(self_us), int(cumulative_us)))
+    return modules
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_supabase_stand_in() -> int:
+    """
+    Serve just enough of the Supabase auth API on localhost for
+    verify_supabase_token() to accept any token. Everything else is a 404.
+    """
+    import threading
+
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+
+    async def get_user(request):
+        return JSONResponse({
+            "id": STAND_IN_USER_ID,
+            "aud": "authenticated",
+            "role": "authenticated",
+            "email": "stand-in@example.com",
+            "app_metadata": {},
+            "user_metadata": {},
+            "created_at": "2026-01-01T00:00:00Z"
+        })
+
+    async def not_found(request):
+        # PostgREST-shaped, so the server sees an ordinary "no rows" error
+        return JSONResponse({
+            "code": "PGRST116",
+            "message": "not available in the stand-in",
+            "details": None,
+            "hint": None
+        }, status_code=404)
+
+    app = Starlette(routes=[
+        Route("/auth/v1/user", get_user),
+        Route("/{path:path}", not_found, methods=["GET", "POST", "PATCH", "DELETE"]),
+    ])
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return port
+
+
+def _stand_in_key() -> str:
+    # create_client() only checks that the key looks like a JWT
+    def part(data: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+    return f"{part({'alg': 'HS256', 'typ': 'JWT'})}.{part({'role': 'service_role'})}.stand-in"
+
+
+async def time_to_first_websocket(
+    token: str | None,
+    conversation_id: str | None,
+    warmup: str,
+    timeout: float
+) -> tuple[float, float]:
+    """
+    Spawn uvicorn and return (seconds until /ws/audio answers any handshake,
+    seconds until the first handshake is accepted).
+
+    The accepted handshake goes through verify_supabase_token(), so with
+    CLIENT_WARMUP=off it pays for building the lazy Supabase client. Without
+    --token, auth is served by a local Supabase stand-in.
+    """
+    import websockets
+
+    env = {**os.environ, "CLIENT_WARMUP": warmup}
+    if not token:
+        env["SUPABASE_URL"] = f"http://127.0.0.1:{start_supabase_stand_in()}"
+        env["SUPABASE_SERVICE_ROLE_KEY"] = _stand_in_key()
+        token = "stand-in-token"
+        conversation_id = conversation_id or STAND_IN_CONVERSATION_ID
+
+    port = free_port()
+    base_url = f"ws://127.0.0.1:{port}/ws/audio"
+
+    started = time.monotonic()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env
+    )
+    try:
+        # Serving: a handshake without a token is rejected before any client is touched
+        while True:
+            if time.monotonic() - started > timeout:
+                sys.exit(f"server did not answer a websocket handshake within {timeout}s")
+            try:
+                async with websockets.connect(base_url, open_timeout=timeout):
+                    pass
+                break
+            except websockets.exceptions.InvalidStatus:
+                break
+            except OSError:
+                await asyncio.sleep(0.02)
+        serving = time.monotonic() - started
+
+        # Accepted: the first authenticated handshake
+        url = f"{base_url}?token={token}&conversation_id={conversation_id}"
+        try:
+            async with websockets.connect(url, open_timeout=timeout):
+                accepted = time.monotonic() - started
+        except websockets.exceptions.InvalidStatus as e:
+            sys.exit(f"authenticated websocket was rejected: {e}")
+
+        return serving, accepted
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15, help="number of slowest modules to show")
+    parser.add_argument("--max-import-ms", type=float, help="fail if importing server takes longer")
+    parser.add_argument("--max-ready-ms", type=float, help="fail if the first websocket takes longer")
+    parser.add_argument("--skip-server", action="store_true", help="only run the import profile")
+    parser.add_argument("--token", help="real Supabase access token (default: local auth stand-in)")
+    parser.add_argument("--conversation-id")
+    parser.add_argument("--warmup", default="off", choices=["off", "background", "blocking"],
+                        help="CLIENT_WARMUP for the server (default off, so first use pays for lazy clients)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    failures = []
+
+    modules = import_profile()
+    server_module = next((m for m in modules if m[0] == "server"), None)
+    import_ms = server_module[2] / 1000 if server_module else 0.0
+
+    print(f"import server: {import_ms:.1f} ms cumulative\n")
+    print(f"{'module':<50} {'self ms':>10} {'cumulative ms':>14}")
+    for module, self_us, cumulative_us in sorted(modules, key=lambda m: -m[2])[:args.top]:
+        print(f"{module:<50} {self_us / 1000:>10.1f} {cumulative_us / 1000:>14.1f}")
+
+    imported = {module.split(".")[0] for module, _, _ in modules}
+    eager = [module for module in LAZY_MODULES if module in imported]
+    if eager:
+        failures.append(f"imported eagerly by `import server`: {', '.join(eager)}")
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        failures.append(f"import took {import_ms:.1f} ms (budget {args.max_import_ms} ms)")
+
+    if not args.skip_server:
+        serving, accepted = asyncio.run(time_to_first_websocket(
+            args.token, args.conversation_id, args.warmup, args.timeout
+        ))
+        ready_ms = accepted * 1000
+        print(f"\ntime to serving (rejected handshake): {serving * 1000:.1f} ms")
+        print(f"time to first accepted websocket:     {ready_ms:.1f} ms "
+              f"(first authenticated handshake took {(accepted - serving) * 1000:.1f} ms, CLIENT_WARMUP={args.warmup})")
+        if args.max_ready_ms is not None and ready_ms > args.max_ready_ms:
+            failures.append(f"first accepted websocket took {ready_ms:.1f} ms (budget {args.max_ready_ms} ms)")
+
+    if failures:
+        print("\nFAILED:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Lazy registry for the external service clients.
+
+Importing supabase, openai, youtube_transcript_api and websockets (and
+constructing their clients) is slow, so nothing here happens at import
+time. Each client is built on first attribute access, or up front by
+warm_up().
+"""
+import importlib
+import os
+import threading
+from typing import Any, Callable
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class LazyClient:
+    """
+    Stands in for a client object and builds it with factory on first use.
+    Safe to first-touch from several threads (e.g. a background warm-up).
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self._name = name
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def get(self) -> Any:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.get(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<LazyClient {self._name} ({state})>"
+
+
+_registry: dict[str, LazyClient] = {}
+
+
+def register(name: str, factory: Callable[[], Any]) -> LazyClient:
+    client = LazyClient(name, factory)
+    _registry[name] = client
+    return client
+
+
+def warm_up(names: list[str] | None = None) -> None:
+    """
+    Construct the named clients (all registered clients by default).
+    """
+    for name in names or list(_registry):
+        _registry[name].get()
+
+
+def loaded_clients() -> dict[str, bool]:
+    return {name: client.loaded for name, client in _registry.items()}
+
+
+def _create_supabase():
+    from supabase import create_client
+
+    url: str = os.environ.get("SUPABASE_URL")
+    key: str = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+    return create_client(url, key)
+
+
+def _create_openai():
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI()
+
+
+def _create_openai_hedge():
+    # Only use a separate client when the hedge goes to a different endpoint
+    base_url = os.getenv("LLM_HEDGE_BASE_URL")
+    if not base_url:
+        return openai_client.get()
+
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(
+        base_url=base_url,
+        api_key=os.getenv("LLM_HEDGE_API_KEY") or os.getenv("OPENAI_API_KEY")
+    )
+
+
+def _create_ytt_api():
+    from youtube_transcript_api import YouTubeTranscriptApi
+
+    return YouTubeTranscriptApi()
+
+
+supabase = register("supabase", _create_supabase)
+openai_client = register("openai", _create_openai)
+openai_hedge_client = register("openai_hedge", _create_openai_hedge)
+ytt_api = register("youtube_transcripts", _create_ytt_api)
+websockets = register("websockets", lambda: importlib.import_module("websockets"))
@@ -0,0 +1,307 @@
+"""
+Bulk pre-ingestion of YouTube videos, playlists and channels.
+
+Fetches transcripts, chunks them, embeds the chunks and stores them in
+Supabase so conversations about these videos start instantly.
+
+    python ingest.py --user-id <uuid> <url-or-id> ...
+    python ingest.py --user-id <uuid> --file videos.txt
+
+Progress is saved to a checkpoint file after each video, so an
+interrupted run can simply be restarted with the same arguments.
+
+--transcripts reads saved transcript JSON files (as written by
+benchmarks/chunker_bench.py --save or --synthesize) instead of YouTube.
+--dry-run skips the database but still calls the embeddings API, which
+is billed unless OPENAI_BASE_URL points at a stand-in.
+
+benchmarks/ingest_bench.py runs this CLI against local OpenAI and
+Supabase stand-ins to check checkpoint resume, paging, cleanup after a
+failed write and the rate limits:
+
+    python -m benchmarks.ingest_bench
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+from pytube import Channel, Playlist
+
+from clients import warm_up
+from pipeline.chunking import chunk_by_tokens, estimate_tokens
+from pipeline.rag import (
+    delete_chunks_from_db,
+    embed_chunks,
+    extract_video_id,
+    fetch_transcript,
+    get_chunks_from_db,
+    get_ingested_video,
+    get_or_create_video,
+    set_chunks_ready,
+    store_chunks_in_db
+)
+
+
+def watch_url(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+def expand_inputs(inputs: list[str]) -> list[str]:
+    """
+    Turn video URLs/ids, playlist URLs and channel URLs into a
+    de-duplicated list of video ids, in input order.
+    """
+    video_ids = []
+    for item in inputs:
+        parsed = urlparse(item)
+
+        if "list" in parse_qs(parsed.query) and "v" not in parse_qs(parsed.query):
+            urls = Playlist(item).video_urls
+            print(f"Playlist {item}: {len(urls)} videos")
+            video_ids.extend(extract_video_id(url) for url in urls)
+        elif parsed.path.startswith(("/channel/", "/c/", "/user/", "/@")):
+            urls = Channel(item).video_urls
+            print(f"Channel {item}: {len(urls)} videos")
+            video_ids.extend(extract_video_id(url) for url in urls)
+        else:
+            video_ids.append(extract_video_id(item))
+
+    return list(dict.fromkeys(video_ids))
+
+
+class Checkpoint:
+    """
+    Set of finished video ids, persisted to a JSON file after every update.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.done: set[str] = set()
+        if path.exists():
+            self.done = set(json.loads(path.read_text())["done"])
+
+    def mark_done(self, video_id: str) -> None:
+        self.done.add(video_id)
+        # Write to a temp file and rename so a crash never leaves a torn file
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps({"done": sorted(self.done)}))
+        os.replace(tmp_path, self.path)
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all workers: at most per_minute units per minute.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.available = per_minute
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1) -> None:
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.available >= amount:
+                    self.available -= amount
+                    return
+                await asyncio.sleep((amount - self.available) / self.rate)
+
+
+class Stats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.videos = 0
+        self.skipped = 0
+        self.failed = 0
+        self.chunks = 0
+        self.tokens = 0
+        self.embed_requests = 0
+        self.stage_seconds = {"check": 0.0, "fetch": 0.0, "chunk": 0.0, "embed": 0.0, "store": 0.0}
+
+    def report(self) -> str:
+        elapsed = time.monotonic() - self.started
+        stages = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in self.stage_seconds.items())
+        return (
+            f"{self.videos} videos ingested, {self.skipped} skipped, {self.failed} failed "
+            f"in {elapsed:.1f}s ({self.videos / elapsed:.2f} videos/s, "
+            f"{self.chunks / elapsed:.1f} chunks/s, {self.tokens / elapsed:.0f} tokens/s)\n"
+            f"{self.chunks} chunks, ~{self.tokens} tokens in {self.embed_requests} embedding requests\n"
+            f"Time spent per stage (summed over workers): {stages}"
+        )
+
+
+def load_saved_transcript(transcripts_dir: Path, video_id: str):
+    data = json.loads((transcripts_dir / f"{video_id}.json").read_text())
+    return data["snippets"], data.get("title")
+
+
+def fetch_snippets(video_id: str, transcripts_dir: Path | None):
+    """
+    Runs in a thread. Returns plain snippet dicts so they can be sent to
+    the chunking process pool.
+    """
+    if transcripts_dir:
+        return load_saved_transcript(transcripts_dir, video_id)
+
+    transcript, title = fetch_transcript(watch_url(video_id))
+    snippets = [
+        {"text": s.text, "start": s.start, "duration": s.duration}
+        for s in transcript.snippets
+    ]
+    return snippets, title
+
+
+def chunk_snippets(snippets: list[dict], max_tokens: int, overlap_tokens: int) -> list[dict]:
+    """
+    Runs in a worker process.
+    """
+    transcript = SimpleNamespace(snippets=[SimpleNamespace(**s) for s in snippets])
+    return chunk_by_tokens(transcript, max_tokens, overlap_tokens)
+
+
+class Ingester:
+    def __init__(self, args, checkpoint: Checkpoint):
+        self.args = args
+        self.checkpoint = checkpoint
+        self.stats = Stats()
+        self.fetch_pool = ThreadPoolExecutor(max_workers=args.fetch_workers)
+        self.chunk_pool = ProcessPoolExecutor(max_workers=args.chunk_workers)
+        # Supabase calls are blocking; keep them off the event loop
+        self.db_pool = ThreadPoolExecutor(max_workers=args.db_workers)
+        self.request_limiter = RateLimiter(args.embed_rpm)
+        self.token_limiter = RateLimiter(args.embed_tpm)
+
+    async def run_stage(self, stage: str, pool, fn, *fn_args):
+        started = time.monotonic()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *fn_args)
+        finally:
+            self.stats.stage_seconds[stage] += time.monotonic() - started
+
+    async def embed(self, chunks: list[dict]) -> None:
+        started = time.monotonic()
+        for i in range(0, len(chunks), self.args.embed_batch):
+            batch = chunks[i:i + self.args.embed_batch]
+            tokens = sum(chunk.get("tokens") or estimate_tokens(chunk["text"]) for chunk in batch)
+
+            await self.request_limiter.acquire()
+            await self.token_limiter.acquire(tokens)
+            await embed_chunks(batch)
+
+            self.stats.embed_requests += 1
+            self.stats.tokens += tokens
+        self.stats.stage_seconds["embed"] += time.monotonic() - started
+
+    async def ingest(self, video_id: str) -> None:
+        args = self.args
+
+        # Already fully ingested (by any user, e.g. a student who got there first)
+        if not args.dry_run and await self.run_stage("check", self.db_pool, get_ingested_video, video_id):
+            self.checkpoint.mark_done(video_id)
+            self.stats.skipped += 1
+            print(f"{video_id}: already ingested, skipping")
+            return
+
+        snippets, title = await self.run_stage("fetch", self.fetch_pool, fetch_snippets, video_id, args.transcripts)
+        if not snippets:
+            raise ValueError("transcript is empty")
+
+        chunks = await self.run_stage(
+            "chunk", self.chunk_pool, chunk_snippets, snippets, args.max_tokens, args.overlap_tokens
+        )
+        await self.embed(chunks)
+
+        if not args.dry_run:
+            url = watch_url(video_id)
+            db_id = await self.run_stage("store", self.db_pool, get_or_create_video, args.user_id, url, title)
+
+            # Chunks may be left over from a run that died mid-write; replace them.
+            # The video stays not-ready until every page is written.
+            await self.run_stage("store", self.db_pool, set_chunks_ready, db_id, False)
+            if await self.run_stage("store", self.db_pool, get_chunks_from_db, db_id):
+                await self.run_stage("store", self.db_pool, delete_chunks_from_db, db_id)
+
+            await self.run_stage("store", self.db_pool, store_chunks_in_db, db_id, chunks, args.page_size)
+            await self.run_stage("store", self.db_pool, set_chunks_ready, db_id)
+            self.checkpoint.mark_done(video_id)
+
+        self.stats.videos += 1
+        self.stats.chunks += len(chunks)
+        print(f"[{self.stats.videos}] {video_id}: {len(chunks)} chunks ({title or 'untitled'})")
+
+    async def run(self, video_ids: list[str]) -> None:
+        todo = [video_id for video_id in video_ids if video_id not in self.checkpoint.done]
+        self.stats.skipped = len(video_ids) - len(todo)
+        print(f"{len(todo)} videos to ingest ({self.stats.skipped} already done)")
+
+        # Keep enough videos in flight to saturate the fetch pool without
+        # holding every transcript in memory at once.
+        in_flight = asyncio.Semaphore(self.args.fetch_workers * 2)
+
+        async def worker(video_id: str):
+            async with in_flight:
+                try:
+                    await self.ingest(video_id)
+                except Exception as e:
+                    self.stats.failed += 1
+                    print(f"Failed to ingest {video_id}: {type(e).__name__}: {e}")
+
+        try:
+            await asyncio.gather(*(worker(video_id) for video_id in todo))
+        finally:
+            self.fetch_pool.shutdown()
+            self.chunk_pool.shutdown()
+            self.db_pool.shutdown()
+
+        print(self.stats.report())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("videos", nargs="*", help="video, playlist or channel URLs, or video ids")
+    parser.add_argument("--file", type=Path, help="file with one URL or id per line")
+    parser.add_argument("--user-id", help="Supabase user who will own the video records")
+    parser.add_argument("--checkpoint", type=Path, default=Path(".ingest_checkpoint.json"))
+    parser.add_argument("--transcripts", type=Path, help="read saved transcripts from this directory instead of YouTube")
+    parser.add_argument("--dry-run", action="store_true", help="fetch, chunk and embed but don't write to the database")
+    parser.add_argument("--fetch-workers", type=int, default=8)
+    parser.add_argument("--chunk-workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--db-workers", type=int, default=4)
+    parser.add_argument("--embed-batch", type=int, default=256, help="chunks per embedding request")
+    parser.add_argument("--embed-rpm", type=float, default=500, help="embedding requests per minute")
+    parser.add_argument("--embed-tpm", type=float, default=1_000_000, help="embedding tokens per minute")
+    parser.add_argument("--page-size", type=int, default=500, help="rows per database insert")
+    parser.add_argument("--max-tokens", type=int, default=150)
+    parser.add_argument("--overlap-tokens", type=int, default=20)
+    args = parser.parse_args()
+
+    inputs = list(args.videos)
+    if args.file:
+        inputs += [line.strip() for line in args.file.read_text().splitlines() if line.strip()]
+    if not inputs:
+        parser.error("no videos given")
+    if not args.user_id and not args.dry_run:
+        parser.error("--user-id is required unless --dry-run is set")
+
+    video_ids = expand_inputs(inputs)
+    # Build the OpenAI client before the rate limiters start counting, so
+    # the first request isn't sent late against an already refilling bucket
+    warm_up(["openai"])
+    ingester = Ingester(args, Checkpoint(args.checkpoint))
+    asyncio.run(ingester.run(video_ids))
+
+
+if __name__ == "__main__":
+    main()
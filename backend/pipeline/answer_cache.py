@@ -0,0 +1,238 @@
+import math
+import operator
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Opt-in: the cache is only consulted when ANSWER_CACHE_ENABLED is set.
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+# A lookup scans every entry for the video, so a popular video is capped
+# well below the global limit to keep that scan short.
+ANSWER_CACHE_MAX_PER_VIDEO = int(os.getenv("ANSWER_CACHE_MAX_PER_VIDEO", "200"))
+# Cached TTS audio is raw linear16 at 24 kHz (~48 KB per second of speech),
+# so memory is bounded by bytes as well as by entry count.
+ANSWER_CACHE_MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+
+# Words that usually point back at something said earlier in the conversation.
+# A question containing one of these can't safely be answered from the cache
+# once there is conversation history.
+_REFERRING_WORDS = {
+    "it", "its", "that", "those", "they", "them", "their",
+    "he", "him", "his", "she", "her", "again", "also", "else",
+}
+
+
+@dataclass
+class CachedAnswer:
+    video_id: str
+    question: str
+    # Unit length, so similarity is a single dot product
+    embedding: list[float]
+    text: str
+    # One entry per spoken sentence, so a replay can send the same
+    # sentence_audio_done markers the frontend expects from live TTS.
+    audio_segments: list[bytes]
+    created_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def size(self) -> int:
+        return len(self.text.encode()) + sum(len(segment) for segment in self.audio_segments)
+
+
+def is_cacheable_question(question: str, conversation_history: list[dict]) -> bool:
+    """
+    Only first-turn or context-free questions may be served from the cache.
+    """
+    if not conversation_history:
+        return True
+
+    words = re.findall(r"[a-z']+", question.lower())
+    return not any(word in _REFERRING_WORDS for word in words)
+
+
+def _normalize(vector: list[float]) -> list[float]:
+    norm = math.sqrt(sum(map(operator.mul, vector, vector)))
+    return [x / norm for x in vector] if norm else []
+
+
+class AnswerCache:
+    """
+    Semantic response cache keyed by YouTube video id and query embedding.
+
+    Entries expire after ttl_seconds and the cache holds at most
+    max_entries answers and max_bytes of text and audio across all videos
+    (and max_per_video answers for any one video), evicting least recently
+    used first.
+
+    lookup() is CPU-bound, so callers on the event loop should run it in a
+    thread; the similarity scan runs outside the lock.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = ANSWER_CACHE_SIMILARITY,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        max_bytes: int = ANSWER_CACHE_MAX_BYTES,
+        max_per_video: int = ANSWER_CACHE_MAX_PER_VIDEO
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_per_video = max_per_video
+        self.total_bytes = 0
+
+        self._entries: OrderedDict[int, CachedAnswer] = OrderedDict()
+        # Per video, entry ids in least recently used order
+        self._by_video: dict[str, OrderedDict[int, None]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def lookup(self, video_id: str, query_embedding: list[float]) -> CachedAnswer | None:
+        """
+        Return the most similar cached answer for this video, or None if
+        nothing is above the similarity threshold.
+        """
+        query = _normalize(query_embedding)
+        now = time.monotonic()
+
+        with self._lock:
+            candidates = []
+            for entry_id in list(self._by_video.get(video_id, ())):
+                entry = self._entries[entry_id]
+                if now - entry.created_at > self.ttl_seconds:
+                    self._remove(entry_id)
+                    self.expirations += 1
+                else:
+                    candidates.append((entry_id, entry))
+
+        best = None
+        best_score = self.similarity_threshold
+
+        if query:
+            for entry_id, entry in candidates:
+                if not entry.embedding:
+                    continue
+                score = sum(map(operator.mul, query, entry.embedding))
+                if score >= best_score:
+                    best = (entry_id, entry)
+                    best_score = score
+
+        with self._lock:
+            if best is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            entry_id, entry = best
+            if entry_id in self._entries:
+                self._touch(entry_id)
+            return entry
+
+    def store(
+        self,
+        video_id: str,
+        question: str,
+        query_embedding: list[float],
+        text: str,
+        audio_segments: list[bytes]
+    ) -> None:
+        """
+        Add an answer to the cache, dropping expired entries and then
+        evicting the least recently used ones if the cache is full.
+        """
+        entry = CachedAnswer(
+            video_id=video_id,
+            question=question,
+            embedding=_normalize(query_embedding),
+            text=text,
+            audio_segments=audio_segments
+        )
+        size = entry.size
+
+        if self.max_entries <= 0 or self.max_per_video <= 0 or size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._remove_expired(entry.created_at)
+
+            video_entries = self._by_video.get(video_id)
+            while video_entries and len(video_entries) >= self.max_per_video:
+                self._remove(next(iter(video_entries)))
+                self.evictions += 1
+
+            while self._entries and (
+                len(self._entries) >= self.max_entries
+                or self.total_bytes + size > self.max_bytes
+            ):
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.evictions += 1
+
+            entry_id = self._next_id
+            self._next_id += 1
+
+            self._entries[entry_id] = entry
+            self.total_bytes += size
+            self._by_video.setdefault(video_id, OrderedDict())[entry_id] = None
+
+    def stats(self) -> dict:
+        """
+        Hit-rate metrics for the cache.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "enabled": ANSWER_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "videos": len(self._by_video),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _touch(self, entry_id: int) -> None:
+        self._entries.move_to_end(entry_id)
+        self._by_video[self._entries[entry_id].video_id].move_to_end(entry_id)
+
+    def _remove_expired(self, now: float) -> None:
+        """
+        Drop expired entries for every video, so stale answers for videos
+        nobody is asking about don't hold on to the byte budget.
+        """
+        expired = [
+            entry_id for entry_id, entry in self._entries.items()
+            if now - entry.created_at > self.ttl_seconds
+        ]
+        for entry_id in expired:
+            self._remove(entry_id)
+        self.expirations += len(expired)
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        self.total_bytes -= entry.size
+        video_entries = self._by_video.get(entry.video_id)
+        if video_entries is not None:
+            video_entries.pop(entry_id, None)
+            if not video_entries:
+                del self._by_video[entry.video_id]
+
+
+answer_cache = AnswerCache()
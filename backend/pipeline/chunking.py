@@ -0,0 +1,145 @@
+import re
+from collections import deque
+from typing import Iterator
+
+
+def chunk_by_timestamp(transcript_list, seconds_per_chunk: int = 60) -> list[dict]:
+    chunks = []
+    current_chunk = {"text": "", "start": transcript_list.snippets[0].start}
+
+    for snippet in transcript_list.snippets:
+        if snippet.start - current_chunk["start"] >= seconds_per_chunk and current_chunk["text"]:
+            chunks.append(current_chunk)
+            current_chunk = {"text": "", "start": snippet.start}
+
+        clean_text = snippet.text.replace('\xa0', ' ').replace('\n', ' ')
+        current_chunk["text"] += " " + clean_text
+
+    if current_chunk["text"].strip():
+        chunks.append(current_chunk)
+
+    return chunks
+
+
+# Rough token estimate for English text (~4 characters per token for
+# OpenAI's tokenizers). Good enough for sizing chunks without pulling in
+# a tokenizer dependency.
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    return estimate_tokens_for_chars(len(text))
+
+
+def estimate_tokens_for_chars(chars: int) -> int:
+    return max(1, (chars + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+def iter_sentences(transcript_list, max_tokens: int) -> Iterator[dict]:
+    """
+    Stream sentences out of transcript snippets as
+    {"text", "start", "end", "tokens"} dicts.
+
+    Auto-generated captions often have no punctuation at all, so a sentence
+    is cut at a word boundary before it would exceed max_tokens. Only a
+    single word longer than the whole budget can produce a larger sentence.
+    """
+    words: list[str] = []
+    # Length of " ".join(words), kept incrementally so assembly stays linear
+    chars = 0
+    start = None
+    end = None
+
+    def sentence():
+        return {"text": " ".join(words), "start": start, "end": end, "tokens": estimate_tokens_for_chars(chars)}
+
+    for snippet in transcript_list.snippets:
+        clean_text = snippet.text.replace('\xa0', ' ').replace('\n', ' ').strip()
+        if not clean_text:
+            continue
+
+        snippet_end = snippet.start + getattr(snippet, "duration", 0.0)
+        pieces = _SENTENCE_END.split(clean_text)
+
+        for i, piece in enumerate(pieces):
+            for word in piece.split():
+                added = len(word) + (1 if words else 0)
+                if words and estimate_tokens_for_chars(chars + added) > max_tokens:
+                    yield sentence()
+                    words, chars, start = [], 0, None
+                    added = len(word)
+
+                if start is None:
+                    start = snippet.start
+                words.append(word)
+                chars += added
+                end = snippet_end
+
+            # Every piece but the last ended with sentence punctuation
+            sentence_done = i < len(pieces) - 1 or piece.endswith(('.', '!', '?'))
+            if sentence_done and words:
+                yield sentence()
+                words, chars, start = [], 0, None
+
+    if words:
+        yield sentence()
+
+
+def chunk_by_tokens(
+    transcript_list,
+    max_tokens: int = 150,
+    overlap_tokens: int = 20
+) -> list[dict]:
+    """
+    Pack whole sentences into chunks of at most max_tokens (estimated),
+    repeating up to overlap_tokens worth of trailing sentences at the start
+    of the next chunk. Each chunk has text, start, end and tokens.
+
+    The defaults give ~140-token chunks, about 1.3x a 30 s caption window,
+    so retrieving 2 of them sends less context than 3 windows did.
+    """
+    chunks = []
+    window: deque[dict] = deque()
+    window_tokens = 0
+    # Sentences at the front of window that were already emitted (overlap)
+    carried = 0
+
+    def emit():
+        first, last = window[0], window[-1]
+        chunks.append({
+            "text": " ".join(sentence["text"] for sentence in window),
+            "start": first["start"],
+            "end": last["end"],
+            "tokens": window_tokens
+        })
+
+    for sentence in iter_sentences(transcript_list, max_tokens):
+        if window and window_tokens + sentence["tokens"] > max_tokens and len(window) > carried:
+            emit()
+
+            # Keep the trailing sentences that fit in the overlap budget
+            kept_tokens = 0
+            kept = 0
+            for previous in reversed(window):
+                if kept_tokens + previous["tokens"] > overlap_tokens:
+                    break
+                kept_tokens += previous["tokens"]
+                kept += 1
+            while len(window) > kept:
+                window_tokens -= window.popleft()["tokens"]
+            carried = kept
+
+        # Overlap must never push a chunk over budget
+        while window and window_tokens + sentence["tokens"] > max_tokens and carried:
+            window_tokens -= window.popleft()["tokens"]
+            carried -= 1
+
+        window.append(sentence)
+        window_tokens += sentence["tokens"]
+
+    if len(window) > carried:
+        emit()
+
+    return chunks
@@ -0,0 +1,239 @@
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# At most this fraction of recent requests may fire a hedge, so a slow
+# upstream can't double our LLM spend.
+LLM_HEDGE_MAX_RATE = float(os.getenv("LLM_HEDGE_MAX_RATE", "0.1"))
+LLM_HEDGE_RATE_WINDOW = int(os.getenv("LLM_HEDGE_RATE_WINDOW", "100"))
+
+
+@dataclass
+class HedgeTarget:
+    """
+    One place a completion request can be sent: a label for metrics,
+    an OpenAI-compatible client and the model to ask for.
+    """
+    label: str
+    client: Any
+    model: str
+
+
+class HedgeStats:
+    """
+    Per-attempt metrics and the hedge-rate budget.
+    """
+
+    def __init__(self, max_rate: float = LLM_HEDGE_MAX_RATE, window: int = LLM_HEDGE_RATE_WINDOW):
+        self.max_rate = max_rate
+        self.window = window
+        # For each hedge fired, the request count at the time it fired.
+        # Stamping the decision (rather than marking the request's own slot)
+        # keeps the cap exact when many requests are waiting on the deadline.
+        self._hedges: deque[int] = deque()
+
+        self.requests = 0
+        self.hedges_fired = 0
+        self.hedges_denied = 0
+        self.attempts: dict[str, dict] = {}
+
+    def start_request(self) -> None:
+        self.requests += 1
+
+    def try_hedge(self) -> bool:
+        """
+        Record a hedge if the budget allows it: at most max_rate * window
+        hedges while the last window requests were started.
+        """
+        while self._hedges and self._hedges[0] <= self.requests - self.window:
+            self._hedges.popleft()
+
+        if len(self._hedges) + 1 > self.max_rate * self.window:
+            self.hedges_denied += 1
+            return False
+
+        self._hedges.append(self.requests)
+        self.hedges_fired += 1
+        return True
+
+    def record_attempt(self, label: str, outcome: str, ttft: float | None) -> None:
+        """
+        outcome is one of "won", "lost", "cancelled" or "error".
+        ttft is the time to first token in seconds, if one arrived.
+        """
+        stats = self.attempts.setdefault(label, {
+            "won": 0, "lost": 0, "cancelled": 0, "error": 0,
+            "ttft_count": 0, "ttft_total": 0.0, "ttft_max": 0.0,
+        })
+        stats[outcome] += 1
+
+        if ttft is not None:
+            stats["ttft_count"] += 1
+            stats["ttft_total"] += ttft
+            stats["ttft_max"] = max(stats["ttft_max"], ttft)
+
+    def snapshot(self) -> dict:
+        attempts = {}
+        for label, stats in self.attempts.items():
+            count = stats["ttft_count"]
+            attempts[label] = {
+                "won": stats["won"],
+                "lost": stats["lost"],
+                "cancelled": stats["cancelled"],
+                "error": stats["error"],
+                "avg_ttft": stats["ttft_total"] / count if count else None,
+                "max_ttft": stats["ttft_max"] if count else None,
+            }
+
+        return {
+            "requests": self.requests,
+            "hedges_fired": self.hedges_fired,
+            "hedges_denied": self.hedges_denied,
+            "hedge_rate": self.hedges_fired / self.requests if self.requests else 0.0,
+            "max_hedge_rate": self.max_rate,
+            "attempts": attempts,
+        }
+
+
+hedge_stats = HedgeStats()
+
+
+async def _open_stream(target: HedgeTarget, messages: list[dict]):
+    """
+    Start a streaming completion and wait for its first token.
+    Returns (first_token, stream, iterator, ttft); first_token is None
+    if the stream ended without producing any text.
+    """
+    started = time.monotonic()
+    stream = await target.client.chat.completions.create(
+        model=target.model,
+        messages=messages,
+        stream=True
+    )
+
+    iterator = stream.__aiter__()
+    try:
+        async for chunk in iterator:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                return delta, stream, iterator, time.monotonic() - started
+    except BaseException:
+        await stream.close()
+        raise
+
+    return None, stream, iterator, time.monotonic() - started
+
+
+async def _discard(task: asyncio.Task, target: HedgeTarget, stats: HedgeStats) -> None:
+    """
+    Cancel a losing attempt, closing its stream if it already opened one.
+    """
+    if not task.done():
+        task.cancel()
+        try:
+            await task
+        except BaseException:
+            pass
+        stats.record_attempt(target.label, "cancelled", None)
+        return
+
+    if task.cancelled():
+        stats.record_attempt(target.label, "cancelled", None)
+    elif task.exception() is not None:
+        stats.record_attempt(target.label, "error", None)
+    else:
+        _, stream, _, ttft = task.result()
+        await stream.close()
+        stats.record_attempt(target.label, "lost", ttft)
+
+
+async def hedged_stream(
+    messages: list[dict],
+    primary: HedgeTarget,
+    hedge: HedgeTarget,
+    first_token_deadline: float,
+    stats: HedgeStats = hedge_stats
+) -> AsyncGenerator[str, None]:
+    """
+    Stream completion tokens from primary. If no first token arrives within
+    first_token_deadline seconds (or the primary fails outright), fire the
+    same request at hedge and stream whichever produces a token first.
+    The losing attempt is cancelled. A deadline <= 0 disables hedging.
+    """
+    stats.start_request()
+
+    tasks = {asyncio.create_task(_open_stream(primary, messages)): primary}
+    hedged = False
+
+    try:
+        timeout = first_token_deadline if first_token_deadline > 0 else None
+        done, _ = await asyncio.wait(tasks, timeout=timeout)
+
+        primary_task = next(iter(tasks))
+        primary_failed = bool(done) and primary_task.exception() is not None
+
+        if first_token_deadline > 0 and (not done or primary_failed) and stats.try_hedge():
+            reason = "failed" if primary_failed else f"gave no token within {first_token_deadline}s"
+            print(f"LLM primary {reason}, hedging with {hedge.label} ({hedge.model})")
+            tasks[asyncio.create_task(_open_stream(hedge, messages))] = hedge
+            hedged = True
+
+        # Wait for the first attempt that successfully produces a token.
+        # Failed attempts drop out; if all of them fail, re-raise the first error.
+        winner = None
+        pending = set(tasks)
+        first_error = None
+
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    first_error = first_error or task.exception()
+                    stats.record_attempt(tasks[task].label, "error", None)
+                elif winner is None:
+                    winner = task
+
+        if winner is None:
+            raise first_error
+
+        first_token, stream, iterator, ttft = winner.result()
+        stats.record_attempt(tasks[winner].label, "won", ttft)
+        if hedged:
+            print(f"LLM {tasks[winner].label} won the hedge (ttft {ttft:.2f}s)")
+
+        for task in pending:
+            await _discard(task, tasks[task], stats)
+        # Attempts that finished alongside the winner still hold open streams
+        for task in done:
+            if task is not winner and not task.exception():
+                await _discard(task, tasks[task], stats)
+        tasks.clear()
+
+    finally:
+        # Only reached with tasks left over if we were cancelled mid-wait
+        for task, target in tasks.items():
+            if not task.done():
+                await _discard(task, target, stats)
+
+    if first_token is None:
+        await stream.close()
+        return
+
+    try:
+        yield first_token
+        async for chunk in iterator:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    finally:
+        await stream.close()
@@ -1,9 +1,20 @@
-from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from typing import AsyncGenerator
+import os
+
+from clients import openai_client as client, openai_hedge_client as hedge_client
+from pipeline.hedging import HedgeTarget, hedged_stream
 
 load_dotenv()
-client = AsyncOpenAI()
+
+LLM_MODEL = "gpt-4o-mini"
+
+# Hedging: if the primary request has produced no token within
+# LLM_FIRST_TOKEN_DEADLINE seconds, a second request is fired against the
+# hedge model/endpoint and whichever streams first wins.
+LLM_FIRST_TOKEN_DEADLINE = float(os.getenv("LLM_FIRST_TOKEN_DEADLINE", "1.0"))
+LLM_HEDGE_MODEL = os.getenv("LLM_HEDGE_MODEL", LLM_MODEL)
+# The hedge endpoint (LLM_HEDGE_BASE_URL) is read in clients.py
 
 SYSTEM_PROMPT = """You are Backtalk, a voice-first AI learning companion. 
 The user has watched a video and talking to you about it out loud.
@@ -20,6 +31,16 @@ You will be given relevant excerpts from the video transcript as context.
 Use this context to give informed answers, but don't just repeat the 
 transcript back — add insight, explanation, and connections."""
 
+def stream_with_hedging(messages: list[dict]) -> AsyncGenerator[str, None]:
+    """
+    Stream completion tokens for messages, hedging the request if the
+    first token is slow to arrive.
+    """
+    primary = HedgeTarget("primary", client, LLM_MODEL)
+    hedge = HedgeTarget("hedge", hedge_client, LLM_HEDGE_MODEL)
+    return hedged_stream(messages, primary, hedge, LLM_FIRST_TOKEN_DEADLINE)
+
+
 async def stream_llm_response(
     user_text: str,
     context_chunks: list[str],
@@ -39,13 +60,5 @@ async def stream_llm_response(
         }
     ]
 
-    stream = await client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=messages,
-        stream=True
-    )
-
-    async for chunk in stream:
-        delta = chunk.choices[0].delta.content
-        if delta:
-            yield delta
\ No newline at end of file
+    async for delta in stream_with_hedging(messages):
+        yield delta
\ No newline at end of file
@@ -1,14 +1,8 @@
-from openai import AsyncOpenAI
 from dotenv import load_dotenv
-from youtube_transcript_api import YouTubeTranscriptApi
 from urllib.parse import urlparse, parse_qs
-from supabase_client import supabase
-from pytube import YouTube
+from clients import openai_client as client, supabase, ytt_api
 
 load_dotenv()
-client = AsyncOpenAI()
-
-ytt_api = YouTubeTranscriptApi()
 
 
 def extract_video_id(video_url: str) -> str:
@@ -30,7 +24,9 @@ def fetch_transcript(video_url: str):
     video_id = extract_video_id(video_url)
     transcript_list = ytt_api.fetch(video_id)
 
-    # Fetch video title using pytube
+    # Fetch video title using pytube (imported here; it is slow to import)
+    from pytube import YouTube
+
     video_title = None
     try:
         yt = YouTube(video_url)
@@ -42,24 +38,6 @@ def fetch_transcript(video_url: str):
     return transcript_list, video_title
 
 
-def chunk_by_timestamp(transcript_list, seconds_per_chunk: int = 60) -> list[dict]:
-    chunks = []
-    current_chunk = {"text": "", "start": transcript_list.snippets[0].start}
-
-    for snippet in transcript_list.snippets:
-        if snippet.start - current_chunk["start"] >= seconds_per_chunk and current_chunk["text"]:
-            chunks.append(current_chunk)
-            current_chunk = {"text": "", "start": snippet.start}
-
-        clean_text = snippet.text.replace('\xa0', ' ').replace('\n', ' ')
-        current_chunk["text"] += " " + clean_text
-
-    if current_chunk["text"].strip():
-        chunks.append(current_chunk)
-
-    return chunks
-
-
 async def embed_chunks(chunks: list[dict]) -> list[dict]:
     texts = [chunk["text"] for chunk in chunks]
 
@@ -93,6 +71,7 @@ def get_or_create_video(user_id: str, youtube_url: str, title: str = None) -> st
     insert_result = supabase.table("videos").insert({
         "user_id": user_id,
         "youtube_url": youtube_url,
+        "youtube_id": extract_video_id(youtube_url),
         "title": title
     }).execute()
 
@@ -146,36 +125,129 @@ def get_chunks_from_db(video_id: str) -> bool:
     return len(result.data) > 0
 
 
-def store_chunks_in_db(video_id: str, chunks: list[dict]) -> None:
+def get_ingested_video(youtube_video_id: str, exclude_video_id: str = None) -> dict | None:
+    """
+    Find a video record (any user's) for this YouTube video whose chunks
+    have all been written, e.g. one pre-ingested by ingest.py.
+    Returns video dict with id and title, or None if there is none.
+    """
+    query = supabase.table("videos")\
+        .select("id, title")\
+        .eq("youtube_id", youtube_video_id)\
+        .eq("chunks_ready", True)
+
+    if exclude_video_id:
+        query = query.neq("id", exclude_video_id)
+
+    result = query.limit(1).execute()
+
+    if result.data:
+        return result.data[0]
+    return None
+
+
+def is_video_ready(video_id: str) -> bool:
+    """
+    Check whether all chunks for this video have been written.
+    """
+    result = supabase.table("videos").select("chunks_ready").eq("id", video_id).execute()
+    return bool(result.data and result.data[0]["chunks_ready"])
+
+
+def set_chunks_ready(video_id: str, ready: bool = True) -> None:
+    """
+    Mark a video's chunks as complete (or, before rewriting them, incomplete).
+    """
+    supabase.table("videos").update({"chunks_ready": ready}).eq("id", video_id).execute()
+
+
+def copy_chunks_from_existing_video(video_id: str, youtube_video_id: str) -> int:
+    """
+    Copy chunks from another, fully ingested video record for the same
+    YouTube video so it doesn't need re-embedding. Marks this video ready.
+    Returns the number of chunks copied.
+    """
+    source = get_ingested_video(youtube_video_id, exclude_video_id=video_id)
+    if not source:
+        return 0
+
+    result = supabase.table("video_chunks")\
+        .select("text, start_time, end_time, embedding")\
+        .eq("video_id", source["id"])\
+        .execute()
+
+    if not result.data:
+        return 0
+
+    chunks = [
+        {
+            "text": row["text"],
+            "start": row["start_time"],
+            "end": row["end_time"],
+            "embedding": row["embedding"]
+        }
+        for row in result.data
+    ]
+    store_chunks_in_db(video_id, chunks)
+    set_chunks_ready(video_id)
+    return len(chunks)
+
+
+def delete_chunks_from_db(video_id: str) -> None:
+    """
+    Remove all stored chunks for a video (e.g. after a partial ingest).
+    """
+    supabase.table("video_chunks").delete().eq("video_id", video_id).execute()
+
+
+def store_chunks_in_db(video_id: str, chunks: list[dict], page_size: int = 500) -> None:
     """
     Store all chunks with embeddings in Supabase.
-    Each chunk should have: text, start, embedding
+    Each chunk should have: text, start, embedding (and optionally end)
+    Rows are inserted in pages of page_size to keep request bodies bounded.
     """
     rows = [
         {
             "video_id": video_id,
             "text": chunk["text"],
             "start_time": chunk["start"],
+            "end_time": chunk.get("end"),
             "embedding": chunk["embedding"]
         }
         for chunk in chunks
     ]
 
-    # Insert all chunks in a batch
-    supabase.table("video_chunks").insert(rows).execute()
+    # Insert chunks one page at a time
+    for i in range(0, len(rows), page_size):
+        supabase.table("video_chunks").insert(rows[i:i + page_size]).execute()
 
 
-async def retrieve_relevant_chunks_from_db(query: str, video_id: str, top_k: int = 3) -> list[str]:
+async def embed_query(query: str) -> list[float]:
     """
-    Retrieve relevant chunks from Supabase using vector similarity search.
-    Replaces the in-memory cosine similarity approach.
+    Embed a user query with the same model used for the video chunks.
     """
-    # Step 1: Embed the user's query (same as before)
     response = await client.embeddings.create(
         model="text-embedding-3-small",
         input=[query]
     )
-    query_embedding = response.data[0].embedding
+    return response.data[0].embedding
+
+
+async def retrieve_relevant_chunks_from_db(
+    query: str,
+    video_id: str,
+    top_k: int = 3,
+    query_embedding: list[float] | None = None
+) -> list[str]:
+    """
+    Retrieve relevant chunks from Supabase using vector similarity search.
+    Replaces the in-memory cosine similarity approach.
+
+    Pass query_embedding to reuse an embedding the caller already computed.
+    """
+    # Step 1: Embed the user's query (unless the caller already did)
+    if query_embedding is None:
+        query_embedding = await embed_query(query)
 
     # Step 2: Call the Supabase RPC function for vector similarity search
     result = supabase.rpc(
@@ -194,10 +266,11 @@ async def retrieve_relevant_chunks_from_db(query: str, video_id: str, top_k: int
 def get_conversation_by_id(conversation_id: str, user_id: str) -> dict | None:
     """
     Get conversation record by ID, verifying ownership.
-    Returns conversation dict with id, video_id, title, or None if not found.
+    Returns conversation dict with id, video_id, title and the video's
+    youtube_url (under "videos"), or None if not found.
     """
     result = supabase.table("conversations")\
-        .select("id, video_id, title")\
+        .select("id, video_id, title, videos(youtube_url)")\
         .eq("id", conversation_id)\
         .eq("user_id", user_id)\
         .single()\
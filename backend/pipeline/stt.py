@@ -0,0 +1,341 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import AsyncGenerator
+from dotenv import load_dotenv
+
+from clients import websockets
+
+load_dotenv()
+
+DEEPGRAM_URL = "wss://api.deepgram.com/v1/listen?encoding=linear16&sample_rate=16000&channels=1&model=nova-3&interim_results=true"
+
+# linear16, 16 kHz, mono
+BYTES_PER_SECOND = 16000 * 2
+
+# Deepgram closes a stream after ~10 s without audio, so send KeepAlive
+# well before that whenever the user is quiet.
+KEEPALIVE_INTERVAL = float(os.getenv("DEEPGRAM_KEEPALIVE_INTERVAL", "4"))
+# Audio not yet covered by a final transcript is kept (up to this many
+# seconds) and replayed to the new connection after an upstream drop.
+REPLAY_BUFFER_SECONDS = float(os.getenv("DEEPGRAM_REPLAY_BUFFER_SECONDS", "8"))
+# At most this many reconnects per session in any RECONNECT_WINDOW seconds,
+# whether or not they succeed, so a connection that's accepted and then
+# dropped straight away can't reconnect and replay forever.
+MAX_RECONNECTS = int(os.getenv("DEEPGRAM_MAX_RECONNECTS", "5"))
+RECONNECT_WINDOW = float(os.getenv("DEEPGRAM_RECONNECT_WINDOW", "60"))
+# Pre-opened connections kept ready for new sessions (0 disables the pool)
+POOL_SIZE = int(os.getenv("DEEPGRAM_POOL_SIZE", "0"))
+# Pooled connections older than this are replaced rather than handed out
+POOL_MAX_AGE = float(os.getenv("DEEPGRAM_POOL_MAX_AGE", "300"))
+
+
+class STTStats:
+    def __init__(self):
+        self.sessions = 0
+        self.pooled_connections = 0
+        self.fresh_connections = 0
+        self.reconnects = 0
+        self.failed_reconnects = 0
+        self.replayed_bytes = 0
+        self.connect_seconds_total = 0.0
+
+    def snapshot(self) -> dict:
+        connections = self.pooled_connections + self.fresh_connections
+        return {
+            "sessions": self.sessions,
+            "pooled_connections": self.pooled_connections,
+            "fresh_connections": self.fresh_connections,
+            "avg_connect_seconds": self.connect_seconds_total / connections if connections else None,
+            "reconnects": self.reconnects,
+            "failed_reconnects": self.failed_reconnects,
+            "replayed_seconds": self.replayed_bytes / BYTES_PER_SECOND,
+        }
+
+
+stt_stats = STTStats()
+
+
+class DeepgramUnavailable(Exception):
+    """
+    The upstream connection dropped and couldn't be re-established.
+    """
+
+
+def _is_open(ws) -> bool:
+    return ws.state.name == "OPEN"
+
+
+async def _connect():
+    extra_headers = {
+        "Authorization": f"Token {os.getenv('DEEPGRAM_API_KEY')}"
+    }
+    return await websockets.connect(DEEPGRAM_URL, additional_headers=extra_headers)
+
+
+async def _close_quietly(ws) -> None:
+    try:
+        await ws.send(json.dumps({"type": "CloseStream"}))
+        await ws.close()
+    except Exception:
+        pass
+
+
+class DeepgramPool:
+    """
+    A few pre-opened Deepgram connections, kept alive and refilled in the
+    background, so a new session can skip the TLS + websocket handshake.
+    """
+
+    def __init__(self, size: int = POOL_SIZE):
+        self.size = size
+        self._idle: deque[tuple[float, object]] = deque()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self.size > 0 and self._task is None:
+            self._task = asyncio.create_task(self._maintain())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        while self._idle:
+            _, ws = self._idle.popleft()
+            await _close_quietly(ws)
+
+    async def acquire(self):
+        """
+        Return an open connection, from the pool if one is ready.
+        """
+        started = time.monotonic()
+
+        while self._idle:
+            opened_at, ws = self._idle.popleft()
+            if _is_open(ws) and time.monotonic() - opened_at < POOL_MAX_AGE:
+                stt_stats.pooled_connections += 1
+                stt_stats.connect_seconds_total += time.monotonic() - started
+                return ws
+            await _close_quietly(ws)
+
+        ws = await _connect()
+        stt_stats.fresh_connections += 1
+        stt_stats.connect_seconds_total += time.monotonic() - started
+        return ws
+
+    async def _maintain(self) -> None:
+        while True:
+            try:
+                # Drop dead or stale connections, keep the rest alive
+                for _ in range(len(self._idle)):
+                    if not self._idle:
+                        # acquire() took the rest while we were sending
+                        break
+                    opened_at, ws = self._idle.popleft()
+                    if _is_open(ws) and time.monotonic() - opened_at < POOL_MAX_AGE:
+                        await ws.send(json.dumps({"type": "KeepAlive"}))
+                        self._idle.append((opened_at, ws))
+                    else:
+                        await _close_quietly(ws)
+
+                while len(self._idle) < self.size:
+                    self._idle.append((time.monotonic(), await _connect()))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Deepgram pool maintenance error: {type(e).__name__}: {e}")
+
+            await asyncio.sleep(KEEPALIVE_INTERVAL)
+
+
+stt_pool = DeepgramPool()
+
+
+class DeepgramSession:
+    """
+    One user's streaming transcription, surviving upstream drops.
+
+    Audio goes in through send_audio(); results come out of transcripts().
+    Audio that Deepgram hasn't finalized yet is kept in a short ring buffer,
+    and if the upstream connection drops it's replayed to a new connection
+    so no speech is lost. If reconnecting fails, transcripts() raises
+    DeepgramUnavailable and further audio is dropped.
+    """
+
+    def __init__(self, pool: DeepgramPool = stt_pool):
+        self.pool = pool
+        self.ws = None
+        self._connected = False
+        self._closing = False
+        self._failed = False
+        # Times of recent reconnect attempts (see RECONNECT_WINDOW)
+        self._reconnects: deque[float] = deque()
+        # Serializes sends, so audio can't slip past a reconnect's replay
+        self._send_lock = asyncio.Lock()
+        self._last_send = time.monotonic()
+        self._keepalive_task: asyncio.Task | None = None
+
+        # Ring buffer of (absolute byte offset, chunk) not yet finalized
+        self._buffer: deque[tuple[int, bytes]] = deque()
+        self._buffered_bytes = 0
+        self._total_bytes = 0
+        # Absolute offset of the first byte sent on the current connection;
+        # Deepgram's timestamps are relative to it.
+        self._connection_base = 0
+
+    async def start(self) -> None:
+        started = time.monotonic()
+        self.ws = await self.pool.acquire()
+        self._connected = True
+        self._last_send = time.monotonic()
+        self._keepalive_task = asyncio.create_task(self._keepalive())
+        stt_stats.sessions += 1
+        print(f"Deepgram connection ready in {time.monotonic() - started:.2f}s")
+
+    async def __aenter__(self) -> "DeepgramSession":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def send_audio(self, data: bytes) -> None:
+        if self._failed:
+            return
+
+        async with self._send_lock:
+            self._buffer.append((self._total_bytes, data))
+            self._total_bytes += len(data)
+            self._buffered_bytes += len(data)
+            self._trim_buffer(REPLAY_BUFFER_SECONDS * BYTES_PER_SECOND)
+
+            if not self._connected:
+                # Kept in the buffer; replayed once we reconnect
+                return
+
+            try:
+                await self.ws.send(data)
+                self._last_send = time.monotonic()
+            except websockets.exceptions.ConnectionClosed:
+                self._connected = False
+
+    async def transcripts(self) -> AsyncGenerator[dict, None]:
+        """
+        Yield Deepgram "Results" messages until the session is closed.
+        Raises DeepgramUnavailable if the upstream can't be reconnected.
+        """
+        while True:
+            try:
+                async for message in self.ws:
+                    data = json.loads(message)
+                    if data.get("type") != "Results":
+                        continue
+                    if data.get("is_final"):
+                        self._mark_finalized(data)
+                    yield data
+            except websockets.exceptions.ConnectionClosed as e:
+                if not self._closing:
+                    print(f"Deepgram connection dropped: {e}")
+
+            self._connected = False
+            if self._closing:
+                return
+            if not await self._reconnect():
+                self._failed = True
+                self._buffer.clear()
+                self._buffered_bytes = 0
+                raise DeepgramUnavailable("Deepgram reconnect failed")
+
+    async def close(self) -> None:
+        self._closing = True
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+        if self.ws is not None:
+            await _close_quietly(self.ws)
+
+    def _mark_finalized(self, data: dict) -> None:
+        """
+        Audio up to the end of a final result no longer needs replaying.
+        """
+        end_seconds = data.get("start", 0.0) + data.get("duration", 0.0)
+        self._trim_buffer_before(self._connection_base + int(end_seconds * BYTES_PER_SECOND))
+
+    def _trim_buffer_before(self, offset: int) -> None:
+        # Whole 16-bit samples only
+        offset -= offset % 2
+        while self._buffer:
+            chunk_offset, chunk = self._buffer[0]
+            if chunk_offset >= offset:
+                break
+            self._buffer.popleft()
+            if chunk_offset + len(chunk) > offset:
+                # Partly finalized: keep only the rest, or a replay would
+                # make Deepgram finalize the same words twice
+                self._buffer.appendleft((offset, chunk[offset - chunk_offset:]))
+                self._buffered_bytes -= offset - chunk_offset
+                break
+            self._buffered_bytes -= len(chunk)
+
+    def _trim_buffer(self, max_bytes: float) -> None:
+        while self._buffer and self._buffered_bytes > max_bytes:
+            _, chunk = self._buffer.popleft()
+            self._buffered_bytes -= len(chunk)
+
+    async def _reconnect(self) -> bool:
+        while not self._closing:
+            now = time.monotonic()
+            while self._reconnects and now - self._reconnects[0] > RECONNECT_WINDOW:
+                self._reconnects.popleft()
+            if len(self._reconnects) >= MAX_RECONNECTS:
+                break
+
+            # Back off by the number of recent attempts, successful or not,
+            # so a connection that keeps dropping right away isn't hammered
+            recent = len(self._reconnects)
+            if recent:
+                await asyncio.sleep(min(0.2 * 2 ** recent, 3.0))
+                if self._closing:
+                    return False
+            self._reconnects.append(time.monotonic())
+
+            try:
+                ws = await _connect()
+            except Exception as e:
+                print(f"Deepgram reconnect attempt {recent + 1} failed: {type(e).__name__}: {e}")
+                continue
+
+            async with self._send_lock:
+                self.ws = ws
+                self._connection_base = self._buffer[0][0] if self._buffer else self._total_bytes
+                try:
+                    for _, chunk in self._buffer:
+                        await ws.send(chunk)
+                except websockets.exceptions.ConnectionClosed:
+                    continue
+                self._connected = True
+                self._last_send = time.monotonic()
+
+            stt_stats.reconnects += 1
+            stt_stats.replayed_bytes += self._buffered_bytes
+            print(f"Deepgram reconnected, replayed {self._buffered_bytes / BYTES_PER_SECOND:.1f}s of audio")
+            return True
+
+        if self._closing:
+            return False
+
+        stt_stats.failed_reconnects += 1
+        print(f"Deepgram reconnect failed ({MAX_RECONNECTS} attempts in {RECONNECT_WINDOW:.0f}s), giving up")
+        return False
+
+    async def _keepalive(self) -> None:
+        while True:
+            await asyncio.sleep(KEEPALIVE_INTERVAL / 2)
+            async with self._send_lock:
+                if not self._connected or time.monotonic() - self._last_send < KEEPALIVE_INTERVAL:
+                    continue
+                try:
+                    await self.ws.send(json.dumps({"type": "KeepAlive"}))
+                    self._last_send = time.monotonic()
+                except websockets.exceptions.ConnectionClosed:
+                    self._connected = False
@@ -1,7 +1,6 @@
 from typing import AsyncGenerator
 import os
 from dotenv import load_dotenv
-import httpx
 
 load_dotenv()
 
@@ -17,6 +16,8 @@ async def stream_tts_audio(text: str) -> AsyncGenerator[bytes, None]:
     Yields:
         bytes: Audio chunks in linear16 PCM format (24kHz sample rate)
     """
+    import httpx
+
     try:
         api_key = os.getenv("DEEPGRAM_API_KEY")
         if not api_key:
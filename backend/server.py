@@ -1,21 +1,25 @@
-import websockets
-import json
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import uvicorn
 import os
 import asyncio
 from dotenv import load_dotenv
-from supabase_client import supabase
+from clients import supabase, warm_up
 
 from pipeline.rag import (
     fetch_transcript,
-    chunk_by_timestamp,
+    copy_chunks_from_existing_video,
+    delete_chunks_from_db,
+    get_ingested_video,
+    is_video_ready,
+    set_chunks_ready,
+    extract_video_id,
     embed_chunks,
     get_or_create_video,
     get_chunks_from_db,
     store_chunks_in_db,
+    embed_query,
     retrieve_relevant_chunks_from_db,
     get_video_by_url,
     get_conversation_by_video,
@@ -24,12 +28,54 @@ from pipeline.rag import (
     load_conversation_history,
     save_message
 )
+from pipeline.chunking import chunk_by_tokens
 from pipeline.llm import stream_llm_response
+from pipeline.hedging import hedge_stats
 from pipeline.tts import stream_tts_audio
+from pipeline.stt import DeepgramSession, DeepgramUnavailable, stt_pool, stt_stats
+from pipeline.answer_cache import (
+    ANSWER_CACHE_ENABLED,
+    answer_cache,
+    is_cacheable_question
+)
 
 load_dotenv()
 
-app = FastAPI()
+# Heavy clients are built lazily (see clients.py). CLIENT_WARMUP controls
+# whether they are built at startup:
+#   "background" - build them after the server starts accepting requests
+#   "blocking"   - build them before the server starts accepting requests
+#   "off"        - build each one on first use
+CLIENT_WARMUP = os.getenv("CLIENT_WARMUP", "background")
+
+
+def warm_up_clients() -> None:
+    try:
+        warm_up()
+        print("Clients warmed up")
+    except Exception as e:
+        print(f"Client warm-up failed: {type(e).__name__}: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup_task = None
+    if CLIENT_WARMUP == "blocking":
+        await asyncio.to_thread(warm_up_clients)
+    elif CLIENT_WARMUP == "background":
+        warmup_task = asyncio.create_task(asyncio.to_thread(warm_up_clients))
+
+    # Keep a few Deepgram connections pre-opened (DEEPGRAM_POOL_SIZE)
+    stt_pool.start()
+
+    yield
+
+    await stt_pool.stop()
+    if warmup_task is not None:
+        await warmup_task
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS to allow requests from the Next.js frontend
 app.add_middleware(
@@ -40,9 +86,6 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
-DEEPGRAM_URL = "wss://api.deepgram.com/v1/listen?encoding=linear16&sample_rate=16000&channels=1&model=nova-3&interim_results=true"
-
-
 # Pydantic models for REST API
 class CreateConversationRequest(BaseModel):
     youtube_url: str
@@ -85,18 +128,29 @@ async def load_video_context(user_id: str, video_url: str, title: str = None) ->
     video_id = get_or_create_video(user_id, video_url, title)
 
     # Check if we've already processed this video
-    if get_chunks_from_db(video_id):
+    if is_video_ready(video_id):
         print(f"Chunks already exist in DB for video {video_id}")
         return video_id
 
+    # Chunks without the ready flag are left over from an interrupted write
+    if get_chunks_from_db(video_id):
+        delete_chunks_from_db(video_id)
+
+    # Reuse chunks from a pre-ingested copy of the same YouTube video
+    copied = copy_chunks_from_existing_video(video_id, extract_video_id(video_url))
+    if copied:
+        print(f"Copied {copied} pre-ingested chunks for video {video_id}")
+        return video_id
+
     # If not, process the video
     print(f"Processing and embedding video: {video_url}")
     transcript, video_title = fetch_transcript(video_url)
-    chunks = chunk_by_timestamp(transcript, seconds_per_chunk=30)
+    chunks = chunk_by_tokens(transcript)
     chunks = await embed_chunks(chunks)
 
     # Store in Supabase
     store_chunks_in_db(video_id, chunks)
+    set_chunks_ready(video_id)
     print(f"Stored {len(chunks)} chunks for video {video_id}")
 
     return video_id
@@ -151,8 +205,13 @@ async def create_conversation_endpoint(
         # Video is new or no conversation exists yet - process it
         print(f"Processing new video: {youtube_url}")
 
-        # Fetch transcript and get video title
-        _, video_title = fetch_transcript(youtube_url)
+        # Take the title from a pre-ingested copy of this video if there is
+        # one; otherwise fetch it from YouTube
+        ingested_video = get_ingested_video(extract_video_id(youtube_url))
+        if ingested_video and ingested_video["title"]:
+            video_title = ingested_video["title"]
+        else:
+            _, video_title = fetch_transcript(youtube_url)
         title = video_title or "Untitled Video"
 
         # Process video (creates/gets video record and stores embeddings)
@@ -174,6 +233,30 @@ async def create_conversation_endpoint(
         raise HTTPException(status_code=500, detail=f"Failed to create conversation: {str(e)}")
 
 
+@app.get("/api/metrics/answer-cache")
+async def answer_cache_metrics():
+    """
+    Hit-rate metrics for the semantic answer cache.
+    """
+    return answer_cache.stats()
+
+
+@app.get("/api/metrics/llm")
+async def llm_metrics():
+    """
+    Per-attempt metrics and hedge rate for LLM requests.
+    """
+    return hedge_stats.snapshot()
+
+
+@app.get("/api/metrics/stt")
+async def stt_metrics():
+    """
+    Connect, pool and reconnect metrics for Deepgram STT sessions.
+    """
+    return stt_stats.snapshot()
+
+
 @app.websocket("/ws/audio")
 async def audio_ws(websocket: WebSocket):
     # Extract token AND conversation_id from query params
@@ -198,19 +281,52 @@ async def audio_ws(websocket: WebSocket):
     await websocket.accept()
     print(f"Client connected (user: {user_id}, conversation: {conversation_id})")
 
-    # Fetch conversation from database
-    conversation = get_conversation_by_id(conversation_id, user_id)
+    # Open (or take a pooled) Deepgram connection while the database
+    # lookups run, so the handshake isn't serialized after them.
+    stt = DeepgramSession()
+    stt_ready = asyncio.create_task(stt.start())
+
+    async def abort(code: int, reason: str):
+        # Don't leave a (billed) Deepgram connection and its keepalive running
+        stt_ready.cancel()
+        await asyncio.gather(stt_ready, return_exceptions=True)
+        await stt.close()
+        await websocket.close(code=code, reason=reason)
+
+    # Fetch conversation from database (verifies ownership). .single()
+    # raises when there is no matching row.
+    try:
+        conversation = await asyncio.to_thread(get_conversation_by_id, conversation_id, user_id)
+    except Exception as e:
+        print(f"Could not load conversation: {type(e).__name__}: {e}")
+        conversation = None
     if not conversation:
-        await websocket.close(code=1008, reason="Conversation not found")
+        await abort(1008, "Conversation not found")
         return
 
     video_id = conversation["video_id"]
     print(f"Using video_id: {video_id} for conversation: {conversation_id}")
 
-    # Load conversation history from database (not empty list)
-    conversation_history = load_conversation_history(conversation_id)
+    # Video records are per user, so the answer cache is keyed by the
+    # YouTube video id to share answers between learners.
+    cache_key = extract_video_id(conversation["videos"]["youtube_url"])
+
+    # Only read the history once ownership is confirmed
+    try:
+        conversation_history = await asyncio.to_thread(load_conversation_history, conversation_id)
+    except Exception as e:
+        print(f"Could not load conversation history: {type(e).__name__}: {e}")
+        await abort(1011, "Could not load conversation")
+        return
     print(f"Loaded {len(conversation_history)} previous messages")
 
+    try:
+        await stt_ready
+    except Exception as e:
+        print(f"Could not connect to Deepgram: {type(e).__name__}: {e}")
+        await websocket.close(code=1011, reason="Speech recognition unavailable")
+        return
+
     utterance_buffer: str = ""
     pause_timer: asyncio.TimerHandle | None = None
     PAUSE_TIMEOUT = 2.5  # seconds - allows for natural pauses in speech
@@ -223,9 +339,29 @@ async def audio_ws(websocket: WebSocket):
 
         print(f"User said: {user_text}")
 
+        # Step 0: For first-turn or context-free questions, check whether a
+        # near-duplicate question about this video has already been answered.
+        query_embedding = None
+        use_cache = ANSWER_CACHE_ENABLED and is_cacheable_question(user_text, conversation_history)
+        # Answers generated with conversation history may depend on it, so
+        # only first-turn answers are safe to replay to someone else.
+        first_turn = not conversation_history
+
+        if use_cache:
+            query_embedding = await embed_query(user_text)
+            # The similarity scan is CPU-bound; keep it off the event loop
+            cached = await asyncio.to_thread(answer_cache.lookup, cache_key, query_embedding)
+
+            if cached:
+                print(f"Answer cache hit for: {user_text[:50]}...")
+                await replay_cached_answer(cached.text, cached.audio_segments)
+                await persist_turn(user_text, cached.text)
+                return
+
         # Step 1: Find relevant video chunks for what the user asked.
+        # Two token-budget chunks carry less context than three 30 s windows.
         relevant_chunks = await retrieve_relevant_chunks_from_db(
-            user_text, video_id, top_k=3
+            user_text, video_id, top_k=2, query_embedding=query_embedding
         )
         print(f"Retrieved {len(relevant_chunks)} relevant chunks")
 
@@ -233,6 +369,8 @@ async def audio_ws(websocket: WebSocket):
         full_response = ""
         sentence_buffer = ""
         sentence_queue = asyncio.Queue()
+        audio_segments: list[bytes] = []
+        sentence_count = 0
 
         # Background task to process sentences and generate TTS
         async def process_tts_sentences():
@@ -249,8 +387,11 @@ async def audio_ws(websocket: WebSocket):
                     print(f"Generating TTS for sentence: {sentence[:50]}...")
 
                     # Generate and stream TTS audio for this sentence
+                    sentence_audio = bytearray()
                     async for audio_chunk in stream_tts_audio(sentence):
                         await websocket.send_bytes(audio_chunk)
+                        sentence_audio += audio_chunk
+                    audio_segments.append(bytes(sentence_audio))
 
                     # Signal to the frontend that this sentence's audio is fully sent
                     # The frontend uses this to know it has a complete WAV file ready to decode
@@ -289,12 +430,14 @@ async def audio_ws(websocket: WebSocket):
             if stripped_buffer and (stripped_buffer.endswith(('.', '!', '?')) or '\n\n' in sentence_buffer):
                 # Complete sentence - queue it for TTS generation
                 await sentence_queue.put(stripped_buffer)
+                sentence_count += 1
                 print(f"✓ Sentence complete! Queued for TTS: {stripped_buffer[:60]}...")
                 sentence_buffer = ""
 
         # Handle any remaining text that didn't end with punctuation
         if sentence_buffer.strip():
             await sentence_queue.put(sentence_buffer.strip())
+            sentence_count += 1
             print(f"Queued final fragment for TTS: {sentence_buffer[:50]}...")
 
         # Signal to the frontend that the LLM response text is complete
@@ -316,7 +459,42 @@ async def audio_ws(websocket: WebSocket):
         })
         print("All TTS audio streaming completed")
 
+        # Only cache answers whose audio came through for every sentence,
+        # so a replay never plays a partial response.
+        if (use_cache and first_turn and full_response
+                and len(audio_segments) == sentence_count and all(audio_segments)):
+            answer_cache.store(cache_key, user_text, query_embedding, full_response, audio_segments)
+
         # Step 4: Persist messages to database AND append to conversation history
+        await persist_turn(user_text, full_response)
+
+    async def replay_cached_answer(text: str, audio_segments: list[bytes]):
+        """
+        Send a cached answer using the same message sequence as a live response.
+        """
+        await websocket.send_json({
+            "type": "llm_response",
+            "text": text,
+            "done": False
+        })
+        await websocket.send_json({
+            "type": "llm_response",
+            "text": "",
+            "done": True
+        })
+
+        for sentence_audio in audio_segments:
+            await websocket.send_bytes(sentence_audio)
+            await websocket.send_json({"type": "sentence_audio_done"})
+
+        await websocket.send_json({
+            "type": "tts_done"
+        })
+
+    async def persist_turn(user_text: str, full_response: str):
+        """
+        Persist messages to database AND append to conversation history.
+        """
         save_message(conversation_id, "user", user_text)
         save_message(conversation_id, "assistant", full_response)
 
@@ -325,18 +503,16 @@ async def audio_ws(websocket: WebSocket):
 
         print(f"Saved messages to DB for conversation {conversation_id}")
 
-    # ---- Deepgram connection and transcript handling ----
-    extra_headers = {
-        "Authorization": f"Token {os.getenv('DEEPGRAM_API_KEY')}"
-    }
-
-    async with websockets.connect(DEEPGRAM_URL, additional_headers=extra_headers) as dg_ws:
+    # ---- Deepgram transcript handling ----
+    async with stt:
         print("Deepgram connection opened")
 
         async def forward_transcripts():
             """
-            Listens for messages from Deepgram and handles them.
-            
+            Listens for transcription results from Deepgram and handles them.
+            The STT session reconnects behind the scenes if the upstream drops;
+            if it gives up, the client websocket is closed with 1011.
+
             For interim results: forward to browser immediately (live feedback).
             For final results: accumulate in the utterance buffer and
             start/reset a pause timer. When the timer fires (user stopped
@@ -345,8 +521,7 @@ async def audio_ws(websocket: WebSocket):
             nonlocal utterance_buffer, pause_timer
 
             try:
-                async for message in dg_ws:
-                    data = json.loads(message)
+                async for data in stt.transcripts():
                     transcript = data["channel"]["alternatives"][0]["transcript"]
 
                     if not transcript:
@@ -396,8 +571,13 @@ async def audio_ws(websocket: WebSocket):
 
                         pause_timer = loop.call_later(PAUSE_TIMEOUT, on_pause)
 
-            except websockets.exceptions.ConnectionClosed:
-                print("Deepgram connection closed")
+            except DeepgramUnavailable as e:
+                # Don't leave the browser streaming into a dead session;
+                # closing makes the receive loop below end too.
+                print(f"Closing client, speech recognition lost: {e}")
+                await websocket.close(code=1011, reason="Speech recognition unavailable")
+            finally:
+                print("Deepgram transcription ended")
 
         # Run transcript listener as a background task.
         # This runs concurrently with the audio forwarding loop below.
@@ -411,7 +591,7 @@ async def audio_ws(websocket: WebSocket):
                 # Receive raw audio bytes from the browser and
                 # forward them directly to Deepgram for transcription.
                 data = await websocket.receive_bytes()
-                await dg_ws.send(data)
+                await stt.send_audio(data)
         except WebSocketDisconnect:
             print("Client disconnected")
         finally:
@@ -422,4 +602,6 @@ async def audio_ws(websocket: WebSocket):
 
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
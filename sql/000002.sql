@@ -0,0 +1,8 @@
+-- ============================================
+-- VIDEO_CHUNKS END TIMES
+-- ============================================
+-- Chunks are now sized by token budget rather than fixed time windows,
+-- so their length in seconds varies. Store where each chunk ends too.
+-- Nullable so rows written by the old timestamp chunker stay valid.
+alter table video_chunks
+  add column if not exists end_time float;
@@ -0,0 +1,33 @@
+-- ============================================
+-- VIDEOS: YOUTUBE ID AND INGEST STATUS
+-- ============================================
+-- Video records are per user, but the same YouTube video can be shared:
+-- chunks embedded once (e.g. by the bulk ingest CLI) are copied to other
+-- users' records instead of being re-embedded.
+--
+-- youtube_id:   the canonical YouTube video id, so records can be matched
+--               exactly no matter which URL form the user pasted.
+-- chunks_ready: set only once every chunk for the video has been written,
+--               so a copy is never taken from an ingest still in progress.
+alter table videos
+  add column if not exists youtube_id text,
+  add column if not exists chunks_ready boolean default false not null;
+
+-- Backfill existing rows. Before this migration, chunks were written in a
+-- single insert, so any video with chunks has all of them.
+update videos
+  set youtube_id = coalesce(
+    substring(youtube_url from '[?&]v=([A-Za-z0-9_-]{11})'),
+    substring(youtube_url from 'youtu\.be/([A-Za-z0-9_-]{11})'),
+    youtube_url
+  )
+  where youtube_id is null;
+
+update videos
+  set chunks_ready = true
+  where id in (select distinct video_id from video_chunks);
+
+-- Fast lookup of ready copies of a YouTube video
+create index if not exists idx_videos_youtube_id_ready
+  on videos(youtube_id)
+  where chunks_ready;